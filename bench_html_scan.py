@@ -0,0 +1,123 @@
+"""Benchmark and fuzz the linear HTML scanner against the old regexes.
+
+Run from the repository root:
+
+    python bench_html_scan.py [--fuzz N] [--max-kb KB]
+
+For each adversarial input shape the scanner's time per MB should stay
+flat as the input grows, while the regex version grows with the size.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "globalPlugins", "readLater"))
+
+import htmlScan  # noqa: E402
+
+REGEX_TIME_LIMIT = 5.0
+
+
+def regex_strip_tags(html):
+    text = re.sub(r"<script\b[^>]*>.*?</script\b[^>]*>", "", html, flags=re.IGNORECASE | re.DOTALL)
+    text = re.sub(r"<style\b[^>]*>.*?</style\b[^>]*>", "", text, flags=re.IGNORECASE | re.DOTALL)
+    text = re.sub(r"<[^>]+>", " ", text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip()
+
+
+def regex_sanitize(html):
+    html = re.sub(r"<(script|style|noscript|iframe|svg|canvas)\b[^>]*>.*?</\1>", "", html, flags=re.IGNORECASE | re.DOTALL)
+    html = re.sub(r"\son\w+\s*=\s*([\"']).*?\1", "", html, flags=re.IGNORECASE | re.DOTALL)
+    return html
+
+
+def _repeat(unit, size):
+    return (unit * (size // len(unit) + 1))[:size]
+
+
+INPUTS = {
+    "article": lambda size: _repeat("<p class=\"x\">Some <b>bold</b> text &amp; more.</p>\n", size),
+    "unclosed scripts": lambda size: _repeat("<script>var a = 1;", size),
+    "unbalanced quotes": lambda size: _repeat("<a onclick=\"x href='y'>t ", size),
+    "inline json": lambda size: "<script>" + _repeat("{\"k\": \"<v>\", \"n\": [1, 2]}, ", size) + "</script>",
+    "lone brackets": lambda size: _repeat("a < b ", size),
+}
+
+
+def _time(func, html):
+    start = time.perf_counter()
+    func(html)
+    return time.perf_counter() - start
+
+
+def run_benchmark(max_kb):
+    sizes = []
+    kb = 16
+    while kb <= max_kb:
+        sizes.append(kb * 1024)
+        kb *= 2
+    pairs = (
+        ("strip_tags", htmlScan.strip_tags, regex_strip_tags),
+        ("sanitize", htmlScan.sanitize, regex_sanitize),
+    )
+    print("%-18s %-10s %8s %14s %14s" % ("input", "function", "KB", "scan s/MB", "regex s/MB"))
+    for input_name, make in INPUTS.items():
+        for func_name, scan_func, regex_func in pairs:
+            regex_gave_up = False
+            for size in sizes:
+                html = make(size)
+                mb = size / (1024.0 * 1024.0)
+                scan_rate = _time(scan_func, html) / mb
+                if regex_gave_up:
+                    regex_text = "skipped"
+                else:
+                    elapsed = _time(regex_func, html)
+                    regex_gave_up = elapsed > REGEX_TIME_LIMIT
+                    regex_text = "%.3f" % (elapsed / mb)
+                print("%-18s %-10s %8d %14.3f %14s" % (input_name, func_name, size // 1024, scan_rate, regex_text))
+
+
+FUZZ_PIECES = (
+    "<", ">", "</", "/>", "\"", "'", "=", " ", "\n", "<!--", "-->", "<!DOCTYPE html>",
+    "<script>", "</script>", "</script foo>", "<style>", "</style>", "<svg/>", "<p>", "</p>",
+    "<a href=\"#\" onclick=\"evil()\">", "onload=", "text", "&amp;", "İ", "<SCRIPT>", "</SCRIPT >",
+)
+
+
+def run_fuzz(count, seed=1):
+    rng = random.Random(seed)
+    worst = 0.0
+    for _ in range(count):
+        html = "".join(rng.choice(FUZZ_PIECES) for _ in range(rng.randint(0, 400)))
+        tokens = list(htmlScan.iter_tokens(html))
+        pos = 0
+        for token in tokens:
+            assert token.start == pos and token.end > token.start, (html, token.kind, token.start)
+            pos = token.end
+        assert pos == len(html), html
+        cleaned = htmlScan.sanitize(html)
+        for token in htmlScan.iter_tokens(cleaned):
+            assert token.kind != "start" or token.name != "script", html
+            assert not any(name.startswith("on") for name, _start, _end in token.attrs), html
+        htmlScan.strip_tags(html)
+        start = time.perf_counter()
+        htmlScan.sanitize(html * 50)
+        worst = max(worst, (time.perf_counter() - start) / max(len(html) * 50, 1))
+    print("fuzzed %d documents; worst sanitize time %.3f s/MB" % (count, worst * 1024 * 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fuzz", type=int, default=2000, help="number of random documents to check")
+    parser.add_argument("--max-kb", type=int, default=512, help="largest input size in KB")
+    args = parser.parse_args()
+    run_fuzz(args.fuzz)
+    run_benchmark(args.max_kb)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,692 @@
+﻿# -*- coding: utf-8 -*-
+import os
+import http.client
+import threading
+import urllib.error
+
+import wx
+import wx.html
+
+import addonHandler
+import api
+import globalPluginHandler
+import gui
+import scriptHandler
+import ui
+import globalVars
+import textInfos
+import tones
+from logHandler import log
+
+from . import core
+
+addonHandler.initTranslation()
+
+ADDON_NAME = "readLater"
+DATA_DIR_NAME = "readLater"
+
+core.set_data_dir(os.path.join(globalVars.appArgs.configPath, DATA_DIR_NAME))
+
+
+def _play_save_tone():
+    try:
+        tones.beep(880, 80)
+    except Exception:
+        try:
+            wx.Bell()
+        except Exception:
+            pass
+
+def _play_error_tone():
+    try:
+        tones.beep(220, 200)
+    except Exception:
+        try:
+            wx.Bell()
+        except Exception:
+            pass
+
+
+def _maximize_message_window(title):
+    try:
+        for win in wx.GetTopLevelWindows():
+            if win.GetTitle() == title:
+                win.Maximize()
+                win.Raise()
+                win.SetFocus()
+                break
+    except Exception:
+        pass
+def _bind_escape_close(dlg):
+    def on_char(event):
+        if event.GetKeyCode() == wx.WXK_ESCAPE:
+            if dlg.IsModal():
+                dlg.EndModal(wx.ID_CANCEL)
+            else:
+                dlg.Close()
+            return
+        event.Skip()
+
+    dlg.Bind(wx.EVT_CHAR_HOOK, on_char)
+
+
+class SaveArticleDialog(wx.Dialog):
+    def __init__(self, parent, url="", title=""):
+        super().__init__(parent, title=_("Save Article"))
+        self.url = url
+        self.title_value = title
+        self.settings = core.load_settings()
+        _bind_escape_close(self)
+
+        sizer = wx.BoxSizer(wx.VERTICAL)
+
+        title_label = wx.StaticText(self, label=_("Title"))
+        self.title_ctrl = wx.TextCtrl(self, value=self.title_value)
+        url_label = wx.StaticText(self, label=_("URL"))
+        self.url_ctrl = wx.TextCtrl(self, value=self.url)
+
+        self.preserve_check = wx.CheckBox(self, label=_("Preserve formatting (HTML)"))
+        self.preserve_check.SetValue(self.settings.get("preserveFormatting", True))
+
+        sizer.Add(title_label, 0, wx.ALL, 5)
+        sizer.Add(self.title_ctrl, 0, wx.EXPAND | wx.LEFT | wx.RIGHT, 5)
+        sizer.Add(url_label, 0, wx.ALL, 5)
+        sizer.Add(self.url_ctrl, 0, wx.EXPAND | wx.LEFT | wx.RIGHT, 5)
+        sizer.Add(self.preserve_check, 0, wx.ALL, 5)
+
+        btn_sizer = self.CreateButtonSizer(wx.OK | wx.CANCEL)
+        sizer.Add(btn_sizer, 0, wx.EXPAND | wx.ALL, 10)
+
+        self.SetSizerAndFit(sizer)
+
+    def get_values(self):
+        return self.title_ctrl.GetValue().strip(), self.url_ctrl.GetValue().strip(), self.preserve_check.GetValue()
+
+
+class OrganizeDialog(wx.Dialog):
+    def __init__(self, parent, record, folders):
+        super().__init__(parent, title=_("Organize Article"))
+        _bind_escape_close(self)
+
+        sizer = wx.BoxSizer(wx.VERTICAL)
+
+        tags_label = wx.StaticText(self, label=_("Tags (separated by commas)"))
+        self.tags_ctrl = wx.TextCtrl(self, value=", ".join(record.get("tags", [])))
+        folder_label = wx.StaticText(self, label=_("Folder"))
+        self.folder_ctrl = wx.ComboBox(self, value=record.get("folder", ""), choices=folders)
+        self.read_check = wx.CheckBox(self, label=_("Read"))
+        self.read_check.SetValue(bool(record.get("read")))
+        self.archived_check = wx.CheckBox(self, label=_("Archived"))
+        self.archived_check.SetValue(bool(record.get("archived")))
+
+        sizer.Add(tags_label, 0, wx.ALL, 5)
+        sizer.Add(self.tags_ctrl, 0, wx.EXPAND | wx.LEFT | wx.RIGHT, 5)
+        sizer.Add(folder_label, 0, wx.ALL, 5)
+        sizer.Add(self.folder_ctrl, 0, wx.EXPAND | wx.LEFT | wx.RIGHT, 5)
+        sizer.Add(self.read_check, 0, wx.ALL, 5)
+        sizer.Add(self.archived_check, 0, wx.ALL, 5)
+
+        btn_sizer = self.CreateButtonSizer(wx.OK | wx.CANCEL)
+        sizer.Add(btn_sizer, 0, wx.EXPAND | wx.ALL, 10)
+
+        self.SetSizerAndFit(sizer)
+
+    def get_values(self):
+        tags = [tag.strip() for tag in self.tags_ctrl.GetValue().split(",") if tag.strip()]
+        return tags, self.folder_ctrl.GetValue().strip(), self.read_check.GetValue(), self.archived_check.GetValue()
+
+
+class OutlineDialog(wx.Dialog):
+    def __init__(self, parent, record, outline):
+        super().__init__(parent, title=_("Outline: {title}").format(title=record.get("title", "")), size=(500, 400))
+        self.record = record
+        self.outline = outline
+        _bind_escape_close(self)
+
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        label = wx.StaticText(self, label=_("Headings"))
+        choices = [
+            _("Level {level}: {text}").format(level=entry["level"], text=entry["text"])
+            for entry in outline
+        ]
+        self.headings_list = wx.ListBox(self, choices=choices)
+        self.headings_list.Bind(wx.EVT_LISTBOX_DCLICK, self.on_read)
+        if choices:
+            self.headings_list.SetSelection(0)
+
+        sizer.Add(label, 0, wx.ALL, 5)
+        sizer.Add(self.headings_list, 1, wx.EXPAND | wx.LEFT | wx.RIGHT, 5)
+
+        button_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        self.read_btn = wx.Button(self, label=_("Read Section"))
+        self.read_btn.SetDefault()
+        self.close_btn = wx.Button(self, wx.ID_CANCEL, label=_("Close"))
+        self.read_btn.Bind(wx.EVT_BUTTON, self.on_read)
+        button_sizer.Add(self.read_btn, 0, wx.ALL, 5)
+        button_sizer.Add(self.close_btn, 0, wx.ALL, 5)
+        sizer.Add(button_sizer, 0, wx.ALIGN_CENTER)
+
+        self.SetSizer(sizer)
+        wx.CallAfter(self.headings_list.SetFocus)
+
+    def on_read(self, event):
+        index = self.headings_list.GetSelection()
+        if index == wx.NOT_FOUND:
+            ui.message(_("Select a heading."))
+            return
+        try:
+            html_content = core.read_section(self.record, index, self.outline)
+        except Exception:
+            ui.message(_("Unable to open the article file."))
+            return
+        try:
+            title = self.outline[index]["text"] or self.record.get("title", "Article")
+            ui.browseableMessage(html_content, title, True)
+            wx.CallAfter(_maximize_message_window, title)
+        except Exception:
+            ui.message(_("Unable to open the reader view."))
+
+
+class LibraryDialog(wx.Dialog):
+    def __init__(self, parent):
+        super().__init__(parent, title=_("Read Later Library"), size=(750, 500))
+        self.records = core.load_index()
+        self.filtered = list(self.records)
+        _bind_escape_close(self)
+
+        main_sizer = wx.BoxSizer(wx.VERTICAL)
+
+        search_label = wx.StaticText(self, label=_("Search or filter (for example: is:unread tag:python NOT is:archived)"))
+        self.search_ctrl = wx.SearchCtrl(self)
+        self.search_ctrl.Bind(wx.EVT_TEXT, self.on_search)
+
+        main_sizer.Add(search_label, 0, wx.ALL, 5)
+        main_sizer.Add(self.search_ctrl, 0, wx.EXPAND | wx.LEFT | wx.RIGHT, 5)
+
+        self.list_ctrl = wx.ListCtrl(self, style=wx.LC_REPORT | wx.BORDER_SUNKEN)
+        self.list_ctrl.InsertColumn(0, _("Title"), width=260)
+        self.list_ctrl.InsertColumn(1, _("Date"), width=120)
+        self.list_ctrl.InsertColumn(2, _("Words"), width=80)
+        self.list_ctrl.InsertColumn(3, _("Tags"), width=140)
+        self.list_ctrl.InsertColumn(4, _("Folder"), width=100)
+        self.list_ctrl.InsertColumn(5, _("URL"), width=260)
+        self.list_ctrl.Bind(wx.EVT_LIST_ITEM_ACTIVATED, self.on_open)
+
+        main_sizer.Add(self.list_ctrl, 1, wx.EXPAND | wx.ALL, 5)
+
+        button_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        self.open_btn = wx.Button(self, label=_("Read"))
+        self.outline_btn = wx.Button(self, label=_("Outline"))
+        self.changes_btn = wx.Button(self, label=_("Changes"))
+        self.organize_btn = wx.Button(self, label=_("Organize"))
+        self.export_btn = wx.Button(self, label=_("Export"))
+        self.export_all_btn = wx.Button(self, label=_("Export All"))
+        self.backup_btn = wx.Button(self, label=_("Back Up"))
+        self.restore_btn = wx.Button(self, label=_("Restore"))
+        self.delete_btn = wx.Button(self, label=_("Delete"))
+        self.close_btn = wx.Button(self, label=_("Close"))
+
+        self.open_btn.Bind(wx.EVT_BUTTON, self.on_open)
+        self.outline_btn.Bind(wx.EVT_BUTTON, self.on_outline)
+        self.changes_btn.Bind(wx.EVT_BUTTON, self.on_changes)
+        self.organize_btn.Bind(wx.EVT_BUTTON, self.on_organize)
+        self.export_btn.Bind(wx.EVT_BUTTON, self.on_export)
+        self.export_all_btn.Bind(wx.EVT_BUTTON, self.on_export_all)
+        self.backup_btn.Bind(wx.EVT_BUTTON, self.on_backup)
+        self.restore_btn.Bind(wx.EVT_BUTTON, self.on_restore)
+        self.delete_btn.Bind(wx.EVT_BUTTON, self.on_delete)
+        self.close_btn.Bind(wx.EVT_BUTTON, lambda evt: self.Close())
+
+        for btn in (
+            self.open_btn, self.outline_btn, self.changes_btn, self.organize_btn, self.export_btn, self.export_all_btn,
+            self.backup_btn, self.restore_btn, self.delete_btn, self.close_btn,
+        ):
+            button_sizer.Add(btn, 0, wx.ALL, 5)
+
+        main_sizer.Add(button_sizer, 0, wx.ALIGN_CENTER)
+
+        self.SetSizer(main_sizer)
+        self._refresh_list()
+        wx.CallAfter(self._focus_list)
+
+    def _focus_list(self):
+        if self.list_ctrl.GetItemCount() > 0:
+            self.list_ctrl.Select(0)
+            self.list_ctrl.EnsureVisible(0)
+        self.list_ctrl.SetFocus()
+
+    def _refresh_list(self):
+        self.list_ctrl.DeleteAllItems()
+        for record in self.filtered:
+            index = self.list_ctrl.InsertItem(self.list_ctrl.GetItemCount(), record.get("title", ""))
+            self.list_ctrl.SetItem(index, 1, record.get("dateSaved", ""))
+            self.list_ctrl.SetItem(index, 2, str(record.get("wordCount", "")))
+            self.list_ctrl.SetItem(index, 3, ", ".join(record.get("tags", [])))
+            self.list_ctrl.SetItem(index, 4, record.get("folder", ""))
+            self.list_ctrl.SetItem(index, 5, record.get("url", ""))
+
+    def on_search(self, event):
+        self.filtered = core.query_records(self.records, self.search_ctrl.GetValue())
+        self._refresh_list()
+
+    def _reload_records(self):
+        selected = self._get_selected_record()
+        self.records = core.load_index()
+        self.filtered = core.query_records(self.records, self.search_ctrl.GetValue())
+        self._refresh_list()
+        for index, record in enumerate(self.filtered):
+            if selected and record.get("id") == selected.get("id"):
+                self.list_ctrl.Select(index)
+                self.list_ctrl.Focus(index)
+                break
+
+    def _get_selected_record(self):
+        idx = self.list_ctrl.GetFirstSelected()
+        if idx == -1:
+            return None
+        return self.filtered[idx]
+
+    def on_open(self, event):
+        record = self._get_selected_record()
+        if not record:
+            ui.message(_("Select an article."))
+            return
+        html_path, _text_path = core.article_paths(record)
+        try:
+            with open(html_path, "r", encoding="utf-8") as f:
+                html_content = f.read()
+        except Exception:
+            ui.message(_("Unable to open the article file."))
+            return
+        try:
+            title = record.get("title", "Article")
+            ui.browseableMessage(html_content, title, True)
+            wx.CallAfter(_maximize_message_window, title)
+        except Exception:
+            ui.message(_("Unable to open the reader view."))
+            return
+        if not record.get("read"):
+            try:
+                core.update_record(record["id"], read=True)
+                record["read"] = True
+                record["lastReadRevision"] = record.get("revisions", 1)
+            except Exception:
+                log.exception("Read Later could not mark an article as read")
+
+    def on_organize(self, event):
+        record = self._get_selected_record()
+        if not record:
+            ui.message(_("Select an article."))
+            return
+        folders = sorted({r.get("folder", "") for r in self.records} - {""}, key=str.lower)
+        dlg = OrganizeDialog(self, record, folders)
+        try:
+            if dlg.ShowModal() != wx.ID_OK:
+                return
+            tags, folder, read, archived = dlg.get_values()
+        finally:
+            dlg.Destroy()
+        try:
+            core.update_record(record["id"], tags=tags, folder=folder, read=read, archived=archived)
+        except Exception:
+            log.exception("Read Later could not update an article")
+            ui.message(_("Unable to update the article."))
+            return
+        self._reload_records()
+        ui.message(_("Saved."))
+
+    def on_outline(self, event):
+        record = self._get_selected_record()
+        if not record:
+            ui.message(_("Select an article."))
+            return
+        try:
+            outline = core.load_outline(record)
+        except Exception:
+            ui.message(_("Unable to open the article file."))
+            return
+        if not outline:
+            ui.message(_("This article has no headings."))
+            return
+        dlg = OutlineDialog(self, record, outline)
+        dlg.ShowModal()
+        dlg.Destroy()
+
+    def on_changes(self, event):
+        record = self._get_selected_record()
+        if not record:
+            ui.message(_("Select an article."))
+            return
+        try:
+            html_content = core.changes_since_read(record)
+        except Exception:
+            log.exception("Read Later could not compare article revisions")
+            ui.message(_("Unable to compare revisions."))
+            return
+        if html_content is None:
+            ui.message(_("No changes since you last read this article."))
+            return
+        try:
+            title = _("Changes in {title}").format(title=record.get("title", ""))
+            ui.browseableMessage(html_content, title, True)
+        except Exception:
+            ui.message(_("Unable to open the reader view."))
+
+    def on_export(self, event):
+        record = self._get_selected_record()
+        if not record:
+            ui.message(_("Select an article."))
+            return
+        wildcard = "HTML (*.html)|*.html|Text (*.txt)|*.txt|Markdown (*.md)|*.md|DOCX (*.docx)|*.docx|EPUB (*.epub)|*.epub"
+        try:
+            if gui.mainFrame:
+                gui.mainFrame.prePopup()
+            with wx.FileDialog(self, message=_("Export Article"), wildcard=wildcard, style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT) as dlg:
+                if dlg.ShowModal() != wx.ID_OK:
+                    return
+                path = dlg.GetPath()
+                ext = os.path.splitext(path)[1].lower()
+                format_name = core.EXPORT_FORMATS.get(ext)
+                if not format_name:
+                    ui.message(_("Unsupported export format."))
+                    return
+                try:
+                    core.export_record(record, path, format_name)
+                    ui.message(_("Exported successfully."))
+                except Exception:
+                    ui.message(_("Export failed."))
+        finally:
+            if gui.mainFrame:
+                gui.mainFrame.postPopup()
+
+    def on_export_all(self, event):
+        if not self.records:
+            ui.message(_("No articles to export."))
+            return
+        try:
+            if gui.mainFrame:
+                gui.mainFrame.prePopup()
+            with wx.DirDialog(self, message=_("Export All to Folder")) as dlg:
+                if dlg.ShowModal() != wx.ID_OK:
+                    return
+                folder = dlg.GetPath()
+        finally:
+            if gui.mainFrame:
+                gui.mainFrame.postPopup()
+        for record in self.records:
+            dest = os.path.join(folder, core.safe_file_name(record.get("title", "article")) + ".html")
+            try:
+                core.export_record(record, dest, "html")
+            except Exception:
+                continue
+        ui.message(_("Exported all articles to HTML."))
+
+    def _choose_backup_folder(self, message):
+        settings = core.load_settings()
+        try:
+            if gui.mainFrame:
+                gui.mainFrame.prePopup()
+            with wx.DirDialog(self, message=message, defaultPath=settings.get("backupFolder", "")) as dlg:
+                if dlg.ShowModal() != wx.ID_OK:
+                    return ""
+                folder = dlg.GetPath()
+        finally:
+            if gui.mainFrame:
+                gui.mainFrame.postPopup()
+        settings["backupFolder"] = folder
+        core.save_settings(settings)
+        return folder
+
+    def on_backup(self, event):
+        folder = self._choose_backup_folder(_("Back Up Library to Folder"))
+        if not folder:
+            return
+        ui.message(_("Backing up library, please wait..."))
+        thread = threading.Thread(target=self._backup_worker, args=(folder,))
+        thread.daemon = True
+        thread.start()
+
+    def _backup_worker(self, folder):
+        try:
+            copied, skipped, removed = core.backup_library(folder)
+            wx.CallAfter(
+                ui.message,
+                _("Backup complete. {copied} copied, {skipped} unchanged, {removed} removed.").format(
+                    copied=copied, skipped=skipped, removed=removed,
+                ),
+            )
+            wx.CallAfter(_play_save_tone)
+        except Exception:
+            log.exception("Read Later backup failed")
+            wx.CallAfter(ui.message, _("Backup failed."))
+            wx.CallAfter(_play_error_tone)
+
+    def on_restore(self, event):
+        folder = self._choose_backup_folder(_("Restore Library from Folder"))
+        if not folder:
+            return
+        if wx.MessageBox(_("Restore the library from this backup? Articles in the backup replace their current versions, and deleted articles come back. Articles saved since the backup are kept."), _("Confirm"), wx.YES_NO | wx.ICON_QUESTION) != wx.YES:
+            return
+        ui.message(_("Restoring library, please wait..."))
+        thread = threading.Thread(target=self._restore_worker, args=(folder,))
+        thread.daemon = True
+        thread.start()
+
+    def _restore_worker(self, folder):
+        try:
+            copied = core.restore_library(folder)
+        except Exception:
+            log.exception("Read Later restore failed")
+            wx.CallAfter(ui.message, _("Restore failed."))
+            wx.CallAfter(_play_error_tone)
+            return
+        wx.CallAfter(self._restore_done, copied)
+
+    def _restore_done(self, copied):
+        # The dialog may have been closed while the restore ran.
+        if self:
+            self._reload_records()
+        ui.message(_("Restored {count} files.").format(count=copied))
+        _play_save_tone()
+
+    def on_delete(self, event):
+        record = self._get_selected_record()
+        if not record:
+            ui.message(_("Select an article."))
+            return
+        if wx.MessageBox(_("Delete selected article?"), _("Confirm"), wx.YES_NO | wx.ICON_QUESTION) != wx.YES:
+            return
+        self.records, failed = core.delete_record(record)
+        if failed:
+            log.warning("Read Later could not remove %s; the library check will quarantine it" % ", ".join(failed))
+        self.filtered = list(self.records)
+        self._refresh_list()
+        ui.message(_("Deleted."))
+
+class GlobalPlugin(globalPluginHandler.GlobalPlugin):
+    scriptCategory = _("Read Later")
+
+    def __init__(self):
+        super().__init__()
+        self._menu_item = None
+        wx.CallAfter(self._add_menu)
+        thread = threading.Thread(target=self._integrity_worker)
+        thread.daemon = True
+        thread.start()
+
+    def terminate(self):
+        try:
+            if self._menu_item:
+                gui.mainFrame.sysTrayIcon.toolsMenu.Remove(self._menu_item)
+        except Exception:
+            pass
+        super().terminate()
+
+    def _integrity_worker(self):
+        try:
+            report = core.check_integrity()
+        except Exception:
+            log.exception("Read Later library check failed")
+            return
+        problems = sum(len(report[key]) for key in ("orphans", "missing", "truncated", "rebuilt", "recounted"))
+        if problems:
+            log.info("Read Later library check repaired %d problems: %r" % (problems, report))
+        if report["removed"]:
+            wx.CallAfter(
+                ui.message,
+                _("Read Later removed {count} articles whose files were lost: {titles}. Their records are in {folder}.").format(
+                    count=len(report["removed"]), titles=", ".join(report["removed"]), folder=report["quarantine"],
+                ),
+            )
+
+    def _add_menu(self):
+        try:
+            menu = gui.mainFrame.sysTrayIcon.toolsMenu
+            self._menu_item = menu.Append(wx.ID_ANY, _("Read Later Add-on"))
+            gui.mainFrame.sysTrayIcon.Bind(wx.EVT_MENU, self._on_open_library, self._menu_item)
+        except Exception:
+            self._menu_item = None
+
+    def _pre_popup(self):
+        try:
+            if gui.mainFrame:
+                gui.mainFrame.prePopup()
+        except Exception:
+            pass
+
+    def _post_popup(self):
+        try:
+            if gui.mainFrame:
+                gui.mainFrame.postPopup()
+        except Exception:
+            pass
+
+    def _on_open_library(self, event):
+        try:
+            self._pre_popup()
+            dlg = LibraryDialog(gui.mainFrame)
+            dlg.ShowModal()
+            dlg.Destroy()
+        finally:
+            self._post_popup()
+
+    @scriptHandler.script(
+        description=_("Open the article library"),
+        gesture="kb:NVDA+j",
+    )
+    def script_openLibrary(self, gesture):
+        wx.CallAfter(self._on_open_library, None)
+
+    def _get_current_url(self):
+        try:
+            obj = api.getFocusObject()
+            if obj is None:
+                return ""
+            ti = getattr(obj, "treeInterceptor", None)
+            if ti:
+                url = getattr(ti, "documentConstantIdentifier", None)
+                if url and isinstance(url, str) and url.startswith("http"):
+                    return url
+            for attr in ("url", "URL", "value"):
+                url = getattr(obj, attr, None)
+                if url and isinstance(url, str) and url.startswith("http"):
+                    return url
+        except Exception:
+            log.exception("Failed to read current URL")
+        return ""
+
+    def _get_current_title(self):
+        try:
+            obj = api.getFocusObject()
+            if obj and getattr(obj, "name", None):
+                return obj.name
+        except Exception:
+            log.exception("Failed to read current title")
+        return ""
+
+    def _get_focus_text_snapshot(self):
+        obj = api.getFocusObject()
+        ti = getattr(obj, "treeInterceptor", None)
+        if not ti:
+            return ""
+        try:
+            text_info = ti.makeTextInfo(textInfos.POSITION_ALL)
+            return text_info.text
+        except Exception:
+            return ""
+
+    @scriptHandler.script(
+        description=_("Save current article"),
+        gesture="kb:NVDA+alt+d",
+    )
+    def script_saveArticle(self, gesture):
+        url = self._get_current_url()
+        title = self._get_current_title()
+        focus_text = self._get_focus_text_snapshot()
+        wx.CallAfter(self._show_save_dialog, url, title, focus_text)
+
+    def _show_save_dialog(self, url, title, focus_text):
+        dlg = None
+        popup_open = False
+        try:
+            if not gui.mainFrame:
+                ui.message(_("NVDA UI is not available."))
+                return
+            self._pre_popup()
+            popup_open = True
+            dlg = SaveArticleDialog(gui.mainFrame, url=url, title=title)
+            result = dlg.ShowModal()
+            if result == wx.ID_OK:
+                title, url, preserve = dlg.get_values()
+                settings = core.load_settings()
+                settings["preserveFormatting"] = preserve
+                core.save_settings(settings)
+                if not url:
+                    ui.message(_("URL is required."))
+                    return
+                wx.CallAfter(ui.message, _("Saving article, please wait..."))
+                thread = threading.Thread(target=self._save_article_worker, args=(title, url, preserve, focus_text))
+                thread.daemon = True
+                thread.start()
+        except Exception:
+            log.exception("Save Article dialog failed")
+            ui.message(_("Save Article failed."))
+        finally:
+            if popup_open:
+                self._post_popup()
+            try:
+                dlg.Destroy()
+            except Exception:
+                pass
+
+    def _save_article_worker(self, title, url, preserve, focus_text):
+        try:
+            record, status, duplicate = core.save_article(url, title, preserve)
+            if status == "revision":
+                wx.CallAfter(ui.message, _("Article updated. Saved as revision {number}.").format(number=record.get("revisions", 2)))
+            elif status == "unchanged":
+                wx.CallAfter(ui.message, _("Article already saved and unchanged."))
+            elif status == "near-duplicate":
+                wx.CallAfter(ui.message, _("Article saved. It is nearly the same as \"{title}\".").format(title=duplicate.get("title", "")))
+            elif duplicate is not None:
+                wx.CallAfter(ui.message, _("Article saved. It duplicates \"{title}\", so the stored copy was reused.").format(title=duplicate.get("title", "")))
+            else:
+                wx.CallAfter(ui.message, _("Article saved."))
+            wx.CallAfter(_play_save_tone)
+        except (urllib.error.URLError, http.client.HTTPException, core.ContentDecodingError):
+            # Unreachable, cut off or undecodable; fall back to what is on screen.
+            if focus_text:
+                try:
+                    clean_html = core.make_plain_html(title or "Article", url, focus_text)
+                    # Derive the text as every other save does so the library check agrees.
+                    core.store_article(title or "Article", url, clean_html, core.html_to_text(clean_html))
+                    wx.CallAfter(ui.message, _("Article saved using on-screen text."))
+                    wx.CallAfter(_play_save_tone)
+                    return
+                except Exception:
+                    pass
+            wx.CallAfter(ui.message, _("Failed to download the page."))
+            wx.CallAfter(_play_error_tone)
+        except Exception:
+            wx.CallAfter(ui.message, _("Saving failed."))
+            wx.CallAfter(_play_error_tone)
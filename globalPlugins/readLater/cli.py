@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""Command-line front end for the Read Later engine.
+
+Runs without NVDA against any library directory, for example the
+readLater folder inside an NVDA configuration. Start it with
+readlater_cli.py from the repository root.
+"""
+import argparse
+import os
+import sys
+
+from . import core
+
+
+def _print_record(record):
+    print("%s  %s  %5s  %s" % (
+        record.get("id", ""), record.get("dateSaved", ""), record.get("wordCount", ""), record.get("title", ""),
+    ))
+
+
+def _read_urls(args):
+    urls = list(args.urls)
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            urls.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    return urls
+
+
+def cmd_save(args):
+    failures = 0
+    for url in _read_urls(args):
+        try:
+            record, status, duplicate = core.save_article(url, args.title or "", not args.plain)
+        except Exception as e:
+            # One bad page must not end a bulk run.
+            print("failed  %s  %s" % (url, e), file=sys.stderr)
+            failures += 1
+            continue
+        if status == "revision":
+            print("revision %d of %s  %s" % (record.get("revisions", 2), record["id"], url))
+        elif status == "unchanged":
+            print("unchanged  %s  %s" % (record["id"], url))
+        elif status == "near-duplicate":
+            print("saved  %s  %s  (near duplicate of %s)" % (record["id"], url, duplicate.get("id", "")))
+        elif duplicate is not None:
+            print("duplicate of %s  %s" % (duplicate.get("id", ""), url))
+        else:
+            print("saved  %s  %s" % (record["id"], url))
+    return 1 if failures else 0
+
+
+def cmd_list(args):
+    records = core.load_index()
+    if args.filter:
+        records = core.query_records(records, args.filter)
+    for record in records:
+        _print_record(record)
+    return 0
+
+
+def cmd_organize(args):
+    record = core.update_record(
+        args.id,
+        tags=args.tags,
+        folder=args.folder,
+        read=args.read,
+        archived=args.archived,
+    )
+    if record is None:
+        print("no article with id %s" % args.id, file=sys.stderr)
+        return 1
+    print("tags: %s  folder: %s  read: %s  archived: %s" % (
+        ", ".join(record.get("tags", [])), record.get("folder", ""), record.get("read"), record.get("archived"),
+    ))
+    return 0
+
+
+def cmd_search(args):
+    for record in core.search_records(core.load_index(), args.term, full_text=args.full_text):
+        _print_record(record)
+    return 0
+
+
+def cmd_changes(args):
+    record = next((r for r in core.load_index() if r.get("id") == args.id), None)
+    if record is None:
+        print("no article with id %s" % args.id, file=sys.stderr)
+        return 1
+    html_content = core.changes_since_read(record)
+    if html_content is None:
+        print("no changes since revision %d" % (record.get("lastReadRevision") or 1))
+        return 0
+    print(core.html_to_text(html_content))
+    return 0
+
+
+def cmd_reindex(args):
+    updated, missing = core.reindex_library()
+    print("reindexed %d articles" % updated)
+    for record in missing:
+        print("missing files  %s  %s" % (record.get("id", ""), record.get("title", "")), file=sys.stderr)
+    return 1 if missing else 0
+
+
+def cmd_export(args):
+    records = core.load_index()
+    if args.ids:
+        wanted = set(args.ids)
+        records = [r for r in records if r.get("id") in wanted]
+    os.makedirs(args.dest, exist_ok=True)
+    failures = 0
+    for record in records:
+        name = "%s-%s.%s" % (core.safe_file_name(record.get("title", "article")), record["id"][:8], args.format)
+        try:
+            core.export_record(record, os.path.join(args.dest, name), args.format)
+        except (OSError, ValueError) as e:
+            print("failed  %s  %s" % (record.get("id", ""), e), file=sys.stderr)
+            failures += 1
+    print("exported %d articles" % (len(records) - failures))
+    return 1 if failures else 0
+
+
+def cmd_compact(args):
+    removed, merged = core.compact_library()
+    print("removed %d files, merged %d duplicate records" % (removed, merged))
+    return 0
+
+
+def cmd_check(args):
+    report = core.check_integrity(repair=not args.no_repair, full=args.full)
+    for key in ("orphans", "missing", "truncated", "rebuilt", "recounted", "removed"):
+        print("%-10s %d" % (key, len(report[key])))
+        for item in report[key]:
+            print("    %s" % item)
+    if report["quarantine"]:
+        print("moved problem files to %s" % report["quarantine"])
+    return 0
+
+
+def cmd_backup(args):
+    copied, skipped, removed = core.backup_library(args.folder)
+    print("copied %d, unchanged %d, removed %d" % (copied, skipped, removed))
+    return 0
+
+
+def cmd_restore(args):
+    print("restored %d files" % core.restore_library(args.folder))
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="readlater", description="Manage a Read Later library without NVDA.")
+    parser.add_argument("--library", required=True, help="library directory (the readLater folder)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    save = commands.add_parser("save", help="download and save articles")
+    save.add_argument("urls", nargs="*", help="article URLs")
+    save.add_argument("--file", help="read more URLs from this file, one per line")
+    save.add_argument("--title", help="title to use instead of the page title")
+    save.add_argument("--plain", action="store_true", help="keep only plain text")
+    save.set_defaults(func=cmd_save)
+
+    list_cmd = commands.add_parser("list", help="list saved articles")
+    list_cmd.add_argument("--filter", help="filter query, for example \"is:unread tag:python NOT is:archived\"")
+    list_cmd.set_defaults(func=cmd_list)
+
+    organize = commands.add_parser("organize", help="set the tags, folder and state of an article")
+    organize.add_argument("id")
+    organize.add_argument("--tag", dest="tags", action="append", help="tag to set (repeatable, replaces existing tags)")
+    organize.add_argument("--folder")
+    organize.add_argument("--read", dest="read", action="store_true", default=None)
+    organize.add_argument("--unread", dest="read", action="store_false")
+    organize.add_argument("--archive", dest="archived", action="store_true", default=None)
+    organize.add_argument("--unarchive", dest="archived", action="store_false")
+    organize.set_defaults(func=cmd_organize)
+
+    search = commands.add_parser("search", help="search titles and URLs")
+    search.add_argument("term")
+    search.add_argument("--full-text", action="store_true", help="search the article text too")
+    search.set_defaults(func=cmd_search)
+
+    changes = commands.add_parser("changes", help="show what changed in an article since it was last read")
+    changes.add_argument("id")
+    changes.set_defaults(func=cmd_changes)
+
+    commands.add_parser("reindex", help="rebuild text, word counts and fingerprints").set_defaults(func=cmd_reindex)
+
+    export = commands.add_parser("export", help="export articles to a folder")
+    export.add_argument("dest")
+    export.add_argument("--format", choices=sorted(set(core.EXPORT_FORMATS.values())), default="html")
+    export.add_argument("--id", dest="ids", action="append", help="export only this article id (repeatable)")
+    export.set_defaults(func=cmd_export)
+
+    commands.add_parser("compact", help="remove unreferenced files and merge duplicates").set_defaults(func=cmd_compact)
+
+    check = commands.add_parser("check", help="find and repair orphan, missing and truncated files")
+    check.add_argument("--no-repair", action="store_true", help="only report problems")
+    check.add_argument("--full", action="store_true", help="recheck files that have not changed")
+    check.set_defaults(func=cmd_check)
+
+    backup = commands.add_parser("backup", help="incrementally back up the library to a folder")
+    backup.add_argument("folder")
+    backup.set_defaults(func=cmd_backup)
+
+    restore = commands.add_parser("restore", help="restore the library from a backup folder")
+    restore.add_argument("folder")
+    restore.set_defaults(func=cmd_restore)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    core.set_data_dir(os.path.abspath(args.library))
+    return args.func(args)
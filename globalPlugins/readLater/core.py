@@ -0,0 +1,1870 @@
+# -*- coding: utf-8 -*-
+"""Read Later engine: fetching, cleaning, storage, search and export.
+
+Everything the add-on does that does not need NVDA lives here, so it can
+be driven from the command line (see readlater_cli.py) or a profiler.
+Call set_data_dir() before using any library function.
+Neither this module nor the modules it imports may import anything from
+NVDA or wx.
+"""
+import os
+import codecs
+import hashlib
+import json
+import re
+import shutil
+import threading
+import uuid
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from html.parser import HTMLParser
+from html import escape, unescape
+from xml.sax.saxutils import escape as xml_escape
+import urllib.request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from . import facets
+from . import htmlScan
+from . import revisions
+
+INDEX_FILE = "index.json"
+FACETS_FILE = "facets.json"
+SETTINGS_FILE = "settings.json"
+ARTICLES_DIR = "articles"
+FETCH_CHUNK_SIZE = 64 * 1024
+SHINGLE_SIZE = 3
+SIMHASH_BITS = 64
+NEAR_DUPLICATE_DISTANCE = 3
+
+BACKUP_MANIFEST_FILE = "readLater-backup.json"
+BACKUP_MANIFEST_VERSION = 1
+BACKUP_SAVE_EVERY = 50
+OUTLINE_SUFFIX = ".outline.json"
+HISTORY_SUFFIX = ".history.gz"
+CONTENT_SUFFIXES = (".html", ".txt", OUTLINE_SUFFIX, HISTORY_SUFFIX)
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+INTEGRITY_STATE_FILE = "integrity.json"
+QUARANTINE_DIR = "quarantine"
+INTEGRITY_WORKERS = 8
+
+DEFAULT_SETTINGS = {
+    "preserveFormatting": True,
+    "backupFolder": "",
+}
+
+ALLOWED_TAGS = {
+    "h1", "h2", "h3", "h4", "h5", "h6",
+    "p", "ul", "ol", "li",
+    "a", "strong", "em", "b", "i",
+    "code", "pre", "blockquote",
+    "br",
+}
+BLOCK_TAGS = {"p", "ul", "ol", "li", "blockquote", "pre", "h1", "h2", "h3", "h4", "h5", "h6"}
+SKIP_TAGS = {"script", "style", "noscript", "svg", "canvas", "iframe"}
+UNWANTED_TAGS = {"nav", "header", "footer", "aside"}
+UNWANTED_CLASS_ID_TOKENS = {
+    "nav", "menu", "breadcrumb", "header", "footer", "top", "share", "social",
+    "toolbar", "subscribe", "newsletter", "comment", "comments", "advert", "ads",
+}
+TAG_MAP = {
+    "div": "p",
+    "section": "p",
+    "article": "p",
+    "main": "p",
+    "header": "p",
+    "footer": "p",
+    "nav": "p",
+    "aside": "p",
+}
+
+
+_data_dir = None
+# Held around every load-modify-save of the index, since saves and the
+# background integrity check run on worker threads.
+_index_lock = threading.RLock()
+
+
+def set_data_dir(path):
+    global _data_dir
+    _data_dir = path
+
+
+def get_data_dir():
+    if _data_dir is None:
+        raise RuntimeError("The Read Later data directory has not been set")
+    return _data_dir
+
+
+def ensure_dirs():
+    data_dir = get_data_dir()
+    articles_dir = os.path.join(data_dir, ARTICLES_DIR)
+    os.makedirs(articles_dir, exist_ok=True)
+    return data_dir, articles_dir
+
+
+def _load_json(path, default):
+    if not os.path.isfile(path):
+        return default
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return default
+
+
+def _save_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _write_text(path, text):
+    # newline="" keeps the file byte-for-byte equal to text, so outline
+    # offsets computed from the string are valid seek positions.
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def load_index():
+    data_dir, _articles_dir = ensure_dirs()
+    return _load_json(os.path.join(data_dir, INDEX_FILE), [])
+
+
+def save_index(records):
+    data_dir, _articles_dir = ensure_dirs()
+    _save_json(os.path.join(data_dir, INDEX_FILE), records)
+
+
+def _load_facets(records):
+    data_dir, _articles_dir = ensure_dirs()
+    return facets.FacetIndex.load(os.path.join(data_dir, FACETS_FILE), records)
+
+
+def _save_facets(facet_index):
+    data_dir, _articles_dir = ensure_dirs()
+    facet_index.save(os.path.join(data_dir, FACETS_FILE))
+
+
+def load_settings():
+    data_dir, _articles_dir = ensure_dirs()
+    settings = _load_json(os.path.join(data_dir, SETTINGS_FILE), DEFAULT_SETTINGS)
+    merged = DEFAULT_SETTINGS.copy()
+    merged.update(settings or {})
+    return merged
+
+
+def save_settings(settings):
+    data_dir, _articles_dir = ensure_dirs()
+    _save_json(os.path.join(data_dir, SETTINGS_FILE), settings)
+
+
+def content_id(record):
+    # Duplicate records share the content files of the first copy saved.
+    return record.get("contentId") or record["id"]
+
+
+def article_paths(record):
+    _data_dir, articles_dir = ensure_dirs()
+    name = content_id(record)
+    return (
+        os.path.join(articles_dir, name + ".html"),
+        os.path.join(articles_dir, name + ".txt"),
+    )
+
+
+def outline_path(record):
+    _data_dir, articles_dir = ensure_dirs()
+    return os.path.join(articles_dir, content_id(record) + OUTLINE_SUFFIX)
+
+
+def history_path(record):
+    # History belongs to the record, not to its (replaceable) content files.
+    _data_dir, articles_dir = ensure_dirs()
+    return os.path.join(articles_dir, record["id"] + HISTORY_SUFFIX)
+
+
+def _referenced_names(records):
+    names = {content_id(r) for r in records}
+    names.update(r["id"] for r in records)
+    return names
+
+
+def _content_name(file_name):
+    # Map a file in articles/ to the content or record id it belongs to.
+    for suffix in CONTENT_SUFFIXES:
+        if file_name.endswith(suffix):
+            return file_name[:-len(suffix)]
+    return None
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(FETCH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _library_files(root):
+    # Articles first and the index last, so an interrupted copy never leaves
+    # an index that points at files which were not copied yet.
+    rel_paths = []
+    articles_dir = os.path.join(root, ARTICLES_DIR)
+    if os.path.isdir(articles_dir):
+        for name in sorted(os.listdir(articles_dir)):
+            if name.endswith(".tmp") or not os.path.isfile(os.path.join(articles_dir, name)):
+                continue
+            rel_paths.append(ARTICLES_DIR + "/" + name)
+    for name in (SETTINGS_FILE, INDEX_FILE):
+        if os.path.isfile(os.path.join(root, name)):
+            rel_paths.append(name)
+    return rel_paths
+
+
+def _copy_atomic(src, dest):
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp_path = dest + ".tmp"
+    shutil.copyfile(src, tmp_path)
+    shutil.copystat(src, tmp_path)
+    os.replace(tmp_path, dest)
+
+
+def _load_backup_manifest(backup_dir):
+    manifest = _load_json(os.path.join(backup_dir, BACKUP_MANIFEST_FILE), None)
+    if not isinstance(manifest, dict) or manifest.get("version") != BACKUP_MANIFEST_VERSION:
+        manifest = {"version": BACKUP_MANIFEST_VERSION, "files": {}}
+    return manifest
+
+
+def _record_files(records):
+    # Every file in articles/ that records use, in a stable order.
+    names = set()
+    for record in records:
+        name = content_id(record)
+        names.update((name + ".html", name + ".txt", name + OUTLINE_SUFFIX))
+        names.add(record["id"] + HISTORY_SUFFIX)
+    return [ARTICLES_DIR + "/" + name for name in sorted(names)]
+
+
+def backup_library(backup_dir):
+    """Mirror the library into backup_dir, copying only files that changed.
+
+    The index is snapshotted under the index lock and only the files it
+    references are copied, so saves during the backup cannot break it or
+    leave the copied index pointing at files that were never copied.
+    The manifest in backup_dir records size, mtime and SHA-256 of every
+    copied file and is saved as the copy progresses, so an interrupted
+    backup resumes where it stopped. Returns (copied, skipped, removed).
+    """
+    data_dir, _articles_dir = ensure_dirs()
+    os.makedirs(backup_dir, exist_ok=True)
+    manifest = _load_backup_manifest(backup_dir)
+    manifest_path = os.path.join(backup_dir, BACKUP_MANIFEST_FILE)
+    entries = manifest["files"]
+    snapshots = {}
+    with _index_lock:
+        for name in (SETTINGS_FILE, INDEX_FILE):
+            path = os.path.join(data_dir, name)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    snapshots[name] = (os.stat(path), f.read())
+        records = load_index()
+    copied = skipped = removed = 0
+    pending = 0
+    current = set(snapshots)
+    # Articles first and the index last, so an interrupted copy never leaves
+    # an index that points at files which were not copied yet.
+    for rel_path in _record_files(records) + list(snapshots):
+        src = os.path.join(data_dir, *rel_path.split("/"))
+        dest = os.path.join(backup_dir, *rel_path.split("/"))
+        entry = entries.get(rel_path)
+        try:
+            stat, data = snapshots[rel_path] if rel_path in snapshots else (os.stat(src), None)
+        except FileNotFoundError:
+            # Missing, or removed by a save since the snapshot; keep any older copy.
+            if entry is not None:
+                current.add(rel_path)
+            continue
+        current.add(rel_path)
+        dest_ok = os.path.isfile(dest) and entry is not None and os.path.getsize(dest) == entry.get("size")
+        if dest_ok and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime:
+            skipped += 1
+            continue
+        try:
+            sha256 = hashlib.sha256(data).hexdigest() if data is not None else _file_sha256(src)
+            if dest_ok and entry.get("sha256") == sha256:
+                skipped += 1
+            elif data is not None:
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                with open(dest + ".tmp", "wb") as f:
+                    f.write(data)
+                os.replace(dest + ".tmp", dest)
+                copied += 1
+            else:
+                _copy_atomic(src, dest)
+                copied += 1
+        except FileNotFoundError:
+            if entry is None:
+                current.discard(rel_path)
+            continue
+        entries[rel_path] = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": sha256}
+        pending += 1
+        if pending >= BACKUP_SAVE_EVERY:
+            _save_json(manifest_path, manifest)
+            pending = 0
+    for rel_path in [p for p in entries if p not in current]:
+        try:
+            os.remove(os.path.join(backup_dir, *rel_path.split("/")))
+        except OSError:
+            pass
+        del entries[rel_path]
+        removed += 1
+    manifest["lastBackup"] = datetime.now().isoformat(timespec="seconds")
+    _save_json(manifest_path, manifest)
+    return copied, skipped, removed
+
+
+def restore_library(backup_dir):
+    """Copy a backup made by backup_library into the NVDA config folder.
+
+    Articles in the backup replace their current versions; articles saved
+    since the backup are kept. Files already present with the recorded
+    hash are left alone, so an interrupted restore can simply be run
+    again. Returns the number of files copied.
+    """
+    manifest_path = os.path.join(backup_dir, BACKUP_MANIFEST_FILE)
+    if not os.path.isfile(manifest_path):
+        raise ValueError("No Read Later backup found in %s" % backup_dir)
+    entries = _load_backup_manifest(backup_dir)["files"]
+    data_dir, _articles_dir = ensure_dirs()
+    copied = 0
+    with _index_lock:
+        for rel_path in _library_files(backup_dir):
+            entry = entries.get(rel_path)
+            if entry is None:
+                continue
+            src = os.path.join(backup_dir, *rel_path.split("/"))
+            dest = os.path.join(data_dir, *rel_path.split("/"))
+            if rel_path != INDEX_FILE and os.path.isfile(dest) and os.path.getsize(dest) == entry["size"] \
+                    and _file_sha256(dest) == entry["sha256"]:
+                continue
+            if _file_sha256(src) != entry["sha256"]:
+                raise ValueError("Backup file is damaged: %s" % rel_path)
+            if rel_path == INDEX_FILE:
+                # Merged below rather than copied over the current index.
+                continue
+            _copy_atomic(src, dest)
+            copied += 1
+        if INDEX_FILE in entries:
+            restored = _load_json(os.path.join(backup_dir, INDEX_FILE), [])
+            restored_ids = {r.get("id") for r in restored}
+            newer = [r for r in load_index() if r.get("id") not in restored_ids]
+            save_index(newer + restored)
+            copied += 1
+        # The tag and state bitmaps describe the old index; rebuild on next use.
+        try:
+            os.remove(os.path.join(data_dir, FACETS_FILE))
+        except OSError:
+            pass
+    return copied
+
+
+class _SimpleHTMLCleaner(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.out = []
+        self.skip_depth = 0
+        self.tag_stack = []
+
+    def handle_starttag(self, tag, attrs):
+        tag = tag.lower()
+        mapped = TAG_MAP.get(tag, tag)
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+            return
+        if self.skip_depth > 0:
+            return
+        if mapped not in ALLOWED_TAGS:
+            return
+        if mapped == "a":
+            self.out.append("<a href=\"#\" role=\"link\" aria-disabled=\"true\" class=\"rl-link\">")
+            self.tag_stack.append(mapped)
+            return
+        if mapped == "br":
+            self.out.append("<br />")
+            return
+        self.out.append("<%s>" % mapped)
+        self.tag_stack.append(mapped)
+
+    def handle_endtag(self, tag):
+        tag = tag.lower()
+        mapped = TAG_MAP.get(tag, tag)
+        if tag in SKIP_TAGS:
+            if self.skip_depth > 0:
+                self.skip_depth -= 1
+            return
+        if self.skip_depth > 0:
+            return
+        if mapped not in ALLOWED_TAGS or mapped == "br":
+            return
+        if mapped in self.tag_stack:
+            while self.tag_stack:
+                open_tag = self.tag_stack.pop()
+                self.out.append("</%s>" % open_tag)
+                if open_tag == mapped:
+                    break
+
+    def handle_data(self, data):
+        if self.skip_depth > 0:
+            return
+        text = data.strip()
+        if not text:
+            return
+        self.out.append(escape(text))
+
+    def get_html(self):
+        while self.tag_stack:
+            self.out.append("</%s>" % self.tag_stack.pop())
+        return "".join(self.out)
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self._last_was_block = False
+
+    def handle_starttag(self, tag, attrs):
+        tag = tag.lower()
+        if tag in BLOCK_TAGS:
+            if self.parts and not self._last_was_block:
+                self.parts.append("\n")
+            self._last_was_block = True
+        if tag == "br":
+            self.parts.append("\n")
+            self._last_was_block = True
+
+    def handle_data(self, data):
+        text = data.strip()
+        if not text:
+            return
+        if self.parts and not self.parts[-1].endswith("\n"):
+            self.parts.append(" ")
+        self.parts.append(text)
+        self._last_was_block = False
+
+    def handle_endtag(self, tag):
+        tag = tag.lower()
+        if tag in BLOCK_TAGS:
+            self.parts.append("\n")
+            self._last_was_block = True
+
+    def get_text(self):
+        text = "".join(self.parts)
+        text = re.sub(r"\n{3,}", "\n\n", text)
+        return text.strip()
+
+
+def _extract_main_html(html):
+    # Try to grab <article> or <main> first, then fall back to <body>.
+    for tag in ("article", "main", "body"):
+        content = htmlScan.find_element_content(html, tag)
+        if content is not None:
+            return content
+    return html
+
+
+def clean_html(html, title, url):
+    main_html = _extract_main_html(html)
+    main_html = _sanitize_html_for_reading(main_html)
+    cleaner = _SimpleHTMLCleaner()
+    cleaner.feed(main_html)
+    cleaned = cleaner.get_html()
+    return _inject_header_and_source(cleaned, title, url)
+
+
+def html_to_text(clean_html):
+    extractor = _TextExtractor()
+    extractor.feed(clean_html)
+    return extractor.get_text()
+
+
+def _sanitize_html_for_reading(html):
+    # Strip active content and event handler attributes in one linear pass.
+    return htmlScan.sanitize(html)
+
+
+def _inject_header_and_source(html, title, url):
+    has_heading = re.search(r"<h[1-6]\b", html, flags=re.IGNORECASE) is not None
+    if not title:
+        title = infer_title_from_html(html) or url or "Article"
+    header = "<h1>%s</h1>" % escape(title)
+    meta = "<p><strong>Source:</strong> %s</p>" % escape(url) if url else ""
+    style = "<style>.rl-link{color:#0066cc;text-decoration:underline;cursor:default;}</style>"
+    insert = style + (header if not has_heading else "") + meta
+    if not insert:
+        return html
+    head_match = re.search(r"<head\b[^>]*>", html, flags=re.IGNORECASE)
+    if head_match:
+        head_idx = head_match.end()
+        html = html[:head_idx] + style + html[head_idx:]
+        insert = (header if not has_heading else "") + meta
+    body_match = re.search(r"<body\b[^>]*>", html, flags=re.IGNORECASE)
+    if body_match:
+        body_idx = body_match.end()
+        return html[:body_idx] + insert + html[body_idx:]
+    return "<html><head><meta charset=\"utf-8\"/>%s</head><body>%s%s</body></html>" % (style, insert, html)
+
+
+def word_count(text):
+    return len(re.findall(r"\b\w+\b", text))
+
+
+def _normalized_words(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def _fingerprint_text(text, url):
+    # The injected "Source: <url>" line differs between syndicated copies.
+    return text.replace(url, "") if url else text
+
+
+def _content_hash(text):
+    normalized = " ".join(_normalized_words(text))
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _simhash(text):
+    words = _normalized_words(text)
+    if len(words) < SHINGLE_SIZE:
+        shingles = [" ".join(words)] if words else []
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return "%016x" % fingerprint
+
+
+def _simhash_distance(a, b):
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def _find_duplicate(records, content_hash, simhash):
+    """Return (record, exact) for the article this text duplicates.
+
+    exact is True when the normalized text is identical and the record's
+    files can be shared; otherwise the record is only a near duplicate
+    (simhash within NEAR_DUPLICATE_DISTANCE bits) or None.
+    """
+    near = None
+    for record in records:
+        if record.get("contentHash") == content_hash and all(os.path.isfile(p) for p in article_paths(record)):
+            return record, True
+        other = record.get("simhash")
+        if near is None and other and _simhash_distance(other, simhash) <= NEAR_DUPLICATE_DISTANCE:
+            near = record
+    return near, False
+
+
+def _same_page(a, b):
+    return a.split("#", 1)[0].strip() == b.split("#", 1)[0].strip()
+
+
+def _write_content(name, clean_html, text_content):
+    html_path, text_path = article_paths({"id": name})
+    _write_text(html_path, clean_html)
+    _write_text(text_path, text_content)
+    _save_json(outline_path({"id": name}), extract_outline(clean_html))
+
+
+def _add_revision(records, record, title, clean_html, text_content):
+    """Store new content for an existing record as its next revision.
+
+    The text goes into the record's history as a delta against the
+    previous revision. The new content gets fresh files, because the old
+    ones may be shared with duplicate records.
+    """
+    path = history_path(record)
+    history = revisions.load_history(path)
+    if not history:
+        # The first revision is the stored text. Once a history exists it is
+        # the delta base, since reindexing and the library check rewrite .txt.
+        _html_path, text_path = article_paths(record)
+        try:
+            with open(text_path, "r", encoding="utf-8", newline="") as f:
+                revisions.append_revision(history, f.read(), record.get("dateSaved", ""))
+        except OSError:
+            pass
+    now = datetime.now().strftime("%Y-%m-%d")
+    number = revisions.append_revision(history, text_content, now)
+    revisions.save_history(path, history)
+
+    old_name = content_id(record)
+    new_name = uuid.uuid4().hex
+    _write_content(new_name, clean_html, text_content)
+    record["contentId"] = new_name
+    if not any(content_id(r) == old_name for r in records):
+        for old_path in article_paths({"id": old_name}) + (outline_path({"id": old_name}),):
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+    record["title"] = title or record.get("title", "")
+    record["dateUpdated"] = now
+    record["revisions"] = number
+    record["lastReadRevision"] = record.get("lastReadRevision") or 1
+    record["read"] = False
+    return number
+
+
+def store_article(title, url, clean_html, text_content):
+    """Save an article and add it to the index.
+
+    Returns (record, status, duplicate). status is "new"; "duplicate" when
+    the text matches another article, whose content files are then shared
+    and which is returned as duplicate; "near-duplicate" when the text
+    nearly matches another article, which is returned as duplicate and
+    linked from the new record's duplicateOf, but the text is stored in
+    full; "revision" when the URL was saved
+    before with different text, in which case that record is updated and
+    returned; or "unchanged" when the URL was saved with the same text.
+    """
+    fingerprint_text = _fingerprint_text(text_content, url)
+    content_hash = _content_hash(fingerprint_text)
+    simhash = _simhash(fingerprint_text)
+    with _index_lock:
+        records = load_index()
+        facet_index = _load_facets(records)
+        previous = next((r for r in records if url and _same_page(r.get("url", ""), url)), None)
+        if previous is not None:
+            if previous.get("contentHash") == content_hash:
+                return previous, "unchanged", None
+            _add_revision(records, previous, title, clean_html, text_content)
+            previous.update({
+                "wordCount": word_count(text_content),
+                "contentHash": content_hash,
+                "simhash": simhash,
+            })
+            records.remove(previous)
+            records.insert(0, previous)
+            save_index(records)
+            facet_index.update(previous)
+            _save_facets(facet_index)
+            return previous, "revision", None
+        duplicate, exact = _find_duplicate(records, content_hash, simhash)
+        article_id = uuid.uuid4().hex
+        record = {
+            "id": article_id,
+            "title": title,
+            "url": url,
+            "dateSaved": datetime.now().strftime("%Y-%m-%d"),
+            "wordCount": word_count(text_content),
+            "contentHash": content_hash,
+            "simhash": simhash,
+            "tags": [],
+            "folder": "",
+            "read": False,
+            "archived": False,
+        }
+        if exact:
+            # The shared files keep the first article's title and Source line.
+            record["contentId"] = content_id(duplicate)
+            record["wordCount"] = duplicate.get("wordCount", record["wordCount"])
+        else:
+            if duplicate is not None:
+                record["duplicateOf"] = duplicate["id"]
+            _write_content(article_id, clean_html, text_content)
+        records.insert(0, record)
+        save_index(records)
+        facet_index.add(record)
+        _save_facets(facet_index)
+    if duplicate is None:
+        return record, "new", None
+    return record, ("duplicate" if exact else "near-duplicate"), duplicate
+
+
+def changes_since_read(record):
+    """Return an HTML page of what changed since record was last read.
+
+    Returns None when there is no newer revision than the one read.
+    """
+    latest = record.get("revisions", 1)
+    base = record.get("lastReadRevision") or 1
+    if latest <= base:
+        return None
+    history = revisions.load_history(history_path(record))
+    if len(history) < latest:
+        return None
+    return revisions.diff_html(
+        revisions.text_at(history, base), revisions.text_at(history, latest),
+        "Changes in %s since revision %d" % (record.get("title", ""), base),
+    )
+
+
+def extract_outline(html):
+    """Return the headings of stored article HTML.
+
+    Each entry has the heading level, its text and the UTF-8 byte offset
+    of the heading tag, so a section can be read by seeking in the file.
+    """
+    outline = []
+    current = None
+    byte_pos = 0
+    char_pos = 0
+    for token in htmlScan.iter_tokens(html):
+        if token.kind == "start" and token.name in HEADING_TAGS:
+            byte_pos += len(html[char_pos:token.start].encode("utf-8"))
+            char_pos = token.start
+            current = {"level": int(token.name[1]), "text": [], "offset": byte_pos}
+            outline.append(current)
+        elif current is not None:
+            if token.kind == "text":
+                current["text"].append(html[token.start:token.end])
+            elif token.kind == "end" and token.name in HEADING_TAGS:
+                current = None
+    for entry in outline:
+        entry["text"] = re.sub(r"\s+", " ", unescape(" ".join(entry["text"]))).strip()
+    return outline
+
+
+def load_outline(record, rebuild=False):
+    """Return the outline of record, building it for older articles."""
+    path = outline_path(record)
+    outline = None if rebuild else _load_json(path, None)
+    if outline is None:
+        html_path, _text_path = article_paths(record)
+        with open(html_path, "r", encoding="utf-8", newline="") as f:
+            outline = extract_outline(f.read())
+        _save_json(path, outline)
+    return outline
+
+
+def read_section(record, index, outline=None):
+    """Return a standalone HTML page holding one section of an article.
+
+    The section runs from heading index up to the next heading of the same
+    or a higher level. Only those bytes are read from the article file.
+    """
+    if outline is None:
+        outline = load_outline(record)
+    entry = outline[index]
+    end = None
+    for following in outline[index + 1:]:
+        if following["level"] <= entry["level"]:
+            end = following["offset"]
+            break
+    html_path, _text_path = article_paths(record)
+    with open(html_path, "rb") as f:
+        f.seek(entry["offset"])
+        data = f.read() if end is None else f.read(end - entry["offset"])
+    body = data.decode("utf-8", errors="replace")
+    if end is None:
+        body = re.sub(r"</body>\s*</html>\s*$", "", body, flags=re.IGNORECASE)
+    return "<html><head><meta charset=\"utf-8\"/><title>%s</title></head><body>%s</body></html>" % (
+        escape(record.get("title", "")), body,
+    )
+
+
+def save_article(url, title="", preserve=True):
+    """Download, clean and store the article at url.
+
+    Raises urllib.error.URLError or http.client.HTTPException when the page
+    cannot be downloaded and ContentDecodingError when its body cannot be
+    decompressed.
+    Returns the same (record, status, duplicate) triple as store_article.
+    """
+    html = fetch_html(url)
+    if not title:
+        title = infer_title_from_html(html) or url
+    article_html = clean_html(html, title, url) if preserve else make_plain_html(title, url, html)
+    return store_article(title, url, article_html, html_to_text(article_html))
+
+
+def delete_record(record):
+    """Remove record from the index and return the remaining records.
+
+    Content files are kept while another record still references them.
+    Returns the paths that could not be removed as the second item; the
+    integrity check moves such leftovers to quarantine later.
+    """
+    with _index_lock:
+        records = load_index()
+        facet_index = _load_facets(records)
+        remaining = [r for r in records if r.get("id") != record.get("id")]
+        save_index(remaining)
+        facet_index.remove(record.get("id"))
+        _save_facets(facet_index)
+    name = content_id(record)
+    shared = any(content_id(r) == name for r in remaining)
+    failed = []
+    paths = () if shared else article_paths(record) + (outline_path(record),)
+    for path in paths + (history_path(record),):
+        try:
+            if os.path.isfile(path):
+                os.remove(path)
+        except OSError:
+            failed.append(path)
+    return remaining, failed
+
+
+def update_record(record_id, tags=None, folder=None, read=None, archived=None):
+    """Change the tags, folder or read/archived state of one record.
+
+    Arguments left as None are not changed. Returns the updated record,
+    or None if no record has that id.
+    """
+    with _index_lock:
+        records = load_index()
+        facet_index = _load_facets(records)
+        for record in records:
+            if record.get("id") == record_id:
+                break
+        else:
+            return None
+        if tags is not None:
+            seen = set()
+            record["tags"] = []
+            for tag in tags:
+                key = facets.normalize_tag(tag)
+                if key and key not in seen:
+                    seen.add(key)
+                    record["tags"].append(tag.strip())
+        if folder is not None:
+            record["folder"] = folder.strip()
+        if read is not None:
+            record["read"] = bool(read)
+        if archived is not None:
+            record["archived"] = bool(archived)
+        if read:
+            record["lastReadRevision"] = record.get("revisions", 1)
+        save_index(records)
+        facet_index.update(record)
+        _save_facets(facet_index)
+    return record
+
+
+def query_records(records, query):
+    """Return the records matching a filter query, in index order.
+
+    See facets.evaluate for the syntax, for example
+    "is:unread tag:python NOT is:archived". A query without filter syntax
+    is a plain title and URL search, as before.
+    """
+    if not facets.is_filter_query(query):
+        return search_records(records, query)
+    facet_index = _load_facets(records)
+    matching = facet_index.ids(facets.evaluate(facet_index, query, records))
+    return [r for r in records if r.get("id") in matching]
+
+
+def search_records(records, term, full_text=False):
+    """Return the records whose title or URL contains term.
+
+    With full_text, the stored article text is searched as well.
+    """
+    term = term.strip().lower()
+    if not term:
+        return list(records)
+    matches = []
+    for record in records:
+        if term in record.get("title", "").lower() or term in record.get("url", "").lower():
+            matches.append(record)
+            continue
+        if full_text:
+            _html_path, text_path = article_paths(record)
+            try:
+                with open(text_path, "r", encoding="utf-8") as f:
+                    if term in f.read().lower():
+                        matches.append(record)
+            except OSError:
+                pass
+    return matches
+
+
+def reindex_library():
+    """Rebuild the text, word count and fingerprints of every record.
+
+    Returns (updated, missing) where missing lists records whose HTML file
+    could not be read.
+    """
+    updated = 0
+    missing = []
+    rebuilt = set()
+    with _index_lock:
+        records = load_index()
+        for record in records:
+            html_path, text_path = article_paths(record)
+            try:
+                with open(html_path, "r", encoding="utf-8") as f:
+                    text_content = html_to_text(f.read())
+            except OSError:
+                missing.append(record)
+                continue
+            if content_id(record) not in rebuilt:
+                _write_text(text_path, text_content)
+                load_outline(record, rebuild=True)
+                rebuilt.add(content_id(record))
+            record["wordCount"] = word_count(text_content)
+            fingerprint_text = _fingerprint_text(text_content, record.get("url", ""))
+            record["contentHash"] = _content_hash(fingerprint_text)
+            record["simhash"] = _simhash(fingerprint_text)
+            updated += 1
+        save_index(records)
+    return updated, missing
+
+
+def compact_library():
+    """Drop unreferenced files and merge records with identical content.
+
+    Returns (removed_files, merged_records).
+    """
+    _data_dir, articles_dir = ensure_dirs()
+    merged = 0
+    removed = 0
+    with _index_lock:
+        records = load_index()
+        # Merge onto the oldest record whose files are all present, which
+        # also repairs records whose own copy has gone missing.
+        by_hash = {}
+        for record in reversed(records):
+            digest = record.get("contentHash")
+            if digest and digest not in by_hash and all(os.path.isfile(p) for p in article_paths(record)):
+                by_hash[digest] = content_id(record)
+        for record in records:
+            target = by_hash.get(record.get("contentHash"))
+            if target is not None and content_id(record) != target:
+                record["contentId"] = target
+                merged += 1
+        save_index(records)
+        referenced = _referenced_names(records)
+        for name in os.listdir(articles_dir):
+            stem = _content_name(name)
+            if name.endswith(".tmp") or (stem is not None and stem not in referenced):
+                try:
+                    os.remove(os.path.join(articles_dir, name))
+                    removed += 1
+                except OSError:
+                    pass
+    return removed, merged
+
+
+def _file_state(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime]
+
+
+def _html_is_complete(path):
+    # Every stored article ends with </html>; a shorter tail means the
+    # write was cut off.
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - 64))
+        return f.read().rstrip().lower().endswith(b"</html>")
+
+
+def _check_content(name, html_path, text_path, expected_words, previous):
+    """Check one content pair; runs on a worker thread.
+
+    Returns (name, problem, state, text) where problem is None, "missing",
+    "truncated", "text" (text file missing or stale) or "words" (only the
+    recorded word count is wrong). text is the stored text for missing or
+    truncated HTML, if any, and the regenerated text for the last two.
+    """
+    state = [_file_state(html_path), _file_state(text_path)]
+    if previous == state and None not in state:
+        return name, None, state, None
+    if state[0] is None or not _html_is_complete(html_path):
+        problem = "missing" if state[0] is None else "truncated"
+        try:
+            with open(text_path, "r", encoding="utf-8") as f:
+                return name, problem, state, f.read() or None
+        except OSError:
+            return name, problem, state, None
+    with open(html_path, "r", encoding="utf-8", errors="replace") as f:
+        text_content = html_to_text(f.read())
+    try:
+        with open(text_path, "r", encoding="utf-8") as f:
+            stored_text = f.read()
+    except OSError:
+        stored_text = None
+    if stored_text is None or word_count(stored_text) != word_count(text_content):
+        return name, "text", state, text_content
+    if expected_words != word_count(text_content):
+        return name, "words", state, text_content
+    return name, None, state, None
+
+
+def _quarantine(paths, records):
+    data_dir, _articles_dir = ensure_dirs()
+    target = os.path.join(data_dir, QUARANTINE_DIR, datetime.now().strftime("%Y%m%d-%H%M%S"))
+    os.makedirs(target, exist_ok=True)
+    for path in paths:
+        try:
+            shutil.move(path, os.path.join(target, os.path.basename(path)))
+        except OSError:
+            pass
+    if records:
+        _save_json(os.path.join(target, "records.json"), records)
+    return target
+
+
+def check_integrity(repair=True, full=False):
+    """Find and fix inconsistencies between the index and articles/.
+
+    Content whose files are unchanged since the last clean check is
+    skipped unless full is set; the rest is checked on a thread pool.
+    Orphan files are moved to a quarantine folder. Missing or truncated
+    HTML is rebuilt as plain text from the text file (the truncated copy
+    is quarantined); only when the text file is gone too are the records
+    dropped, listed under "removed" and quarantined.
+    Stale or missing text files and wrong word counts are rebuilt from
+    the HTML. Returns a dict
+    listing what was found (and fixed, when repair is set).
+    """
+    data_dir, articles_dir = ensure_dirs()
+    state_path = os.path.join(data_dir, INTEGRITY_STATE_FILE)
+    previous_state = {} if full else _load_json(state_path, {})
+    with _index_lock:
+        records = load_index()
+    groups = {}
+    for record in records:
+        groups.setdefault(content_id(record), []).append(record)
+    referenced = _referenced_names(records)
+    report = {
+        "orphans": [], "missing": [], "truncated": [], "rebuilt": [], "recounted": [], "removed": [],
+        "quarantine": "",
+    }
+
+    for name in os.listdir(articles_dir):
+        stem = _content_name(name)
+        if name.endswith(".tmp") or (stem is not None and stem not in referenced):
+            report["orphans"].append(os.path.join(articles_dir, name))
+
+    results = []
+    with ThreadPoolExecutor(max_workers=min(INTEGRITY_WORKERS, (os.cpu_count() or 2) * 2)) as pool:
+        futures = []
+        for name, members in groups.items():
+            html_path, text_path = article_paths(members[0])
+            futures.append(pool.submit(
+                _check_content, name, html_path, text_path,
+                members[0].get("wordCount"), previous_state.get(name),
+            ))
+        for future in futures:
+            results.append(future.result())
+
+    new_state = {}
+    drop = set()
+    rebuild_html = {}
+    rewrite_text = {}
+    word_counts = {}
+    for name, problem, state, text_content in results:
+        if problem in ("missing", "truncated"):
+            report[problem].append(name)
+            if text_content:
+                rebuild_html[name] = text_content
+            else:
+                drop.add(name)
+            continue
+        if problem == "text":
+            report["rebuilt"].append(name)
+            rewrite_text[name] = text_content
+        if problem in ("text", "words"):
+            report["recounted"].append(name)
+            word_counts[name] = word_count(text_content)
+        if state is not None:
+            new_state[name] = state
+
+    if not repair:
+        return report
+    with _index_lock:
+        # Re-read the index: articles may have been saved, revised or deleted
+        # while the scan ran. Content that is no longer referenced is left
+        # alone; its files may already be gone.
+        current = load_index()
+        live = {}
+        for record in current:
+            live.setdefault(content_id(record), record)
+        new_state = {name: state for name, state in new_state.items() if name in live}
+        drop = {name for name in drop if name in live}
+        salvaged = []
+        for name, text_content in rebuild_html.items():
+            record = live.get(name)
+            if record is None:
+                continue
+            html_path, _text_path = article_paths(record)
+            if os.path.isfile(html_path):
+                salvaged.append(html_path + ".truncated")
+                shutil.copyfile(html_path, salvaged[-1])
+            _write_text(html_path, make_plain_html(record.get("title", ""), record.get("url", ""), text_content))
+            load_outline(record, rebuild=True)
+            new_state[name] = [_file_state(p) for p in article_paths(record)]
+        for name, text_content in rewrite_text.items():
+            if name not in live:
+                continue
+            _html_path, text_path = article_paths(live[name])
+            _write_text(text_path, text_content)
+            new_state[name] = [_file_state(p) for p in article_paths(live[name])]
+        removed = [r for r in current if content_id(r) in drop]
+        current = [r for r in current if content_id(r) not in drop]
+        for record in current:
+            if content_id(record) in word_counts:
+                record["wordCount"] = word_counts[content_id(record)]
+        if removed or word_counts:
+            facet_index = _load_facets(current + removed)
+            save_index(current)
+            for record in removed:
+                facet_index.remove(record.get("id"))
+            _save_facets(facet_index)
+        referenced = _referenced_names(current)
+        # Files saved since the scan started belong to records loaded now.
+        report["orphans"] = [
+            p for p in report["orphans"]
+            if p.endswith(".tmp") or _content_name(os.path.basename(p)) not in referenced
+        ]
+        bad_files = list(report["orphans"]) + salvaged
+        for name in drop:
+            paths = article_paths({"id": name}) + (outline_path({"id": name}),)
+            bad_files.extend(p for p in paths if os.path.exists(p))
+        report["removed"] = [r.get("title") or r.get("url", "") for r in removed]
+        if bad_files or removed:
+            report["quarantine"] = _quarantine(bad_files, removed)
+    _save_json(state_path, new_state)
+    return report
+
+
+def _accept_encoding():
+    encodings = ["gzip", "deflate"]
+    if brotli is not None:
+        encodings.append("br")
+    return ", ".join(encodings)
+
+
+class ContentDecodingError(ValueError):
+    """A response body could not be decompressed."""
+
+
+class _StreamDecompressor:
+    """Incrementally undo a Content-Encoding, one network chunk at a time."""
+
+    def __init__(self, content_encoding):
+        self.encoding = (content_encoding or "identity").strip().lower()
+        self._obj = None
+        self._deflate_buffer = b""
+        self._trailer = None
+        self._padding = False
+        if self.encoding in ("gzip", "x-gzip"):
+            self._obj = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.encoding == "br":
+            if brotli is None:
+                raise ContentDecodingError("Brotli encoded response but brotli is not available")
+            self._obj = brotli.Decompressor()
+        elif self.encoding not in ("identity", "deflate"):
+            raise ContentDecodingError("Unsupported content encoding: %s" % self.encoding)
+
+    def _start_deflate(self, data):
+        # Servers send either zlib-wrapped or raw deflate streams for "deflate".
+        self._deflate_buffer += data
+        if len(self._deflate_buffer) < 2:
+            return b""
+        head = self._deflate_buffer[:2]
+        wrapped = (head[0] & 0x0F) == 8 and ((head[0] << 8) | head[1]) % 31 == 0
+        self._obj = zlib.decompressobj(zlib.MAX_WBITS if wrapped else -zlib.MAX_WBITS)
+        data, self._deflate_buffer = self._deflate_buffer, b""
+        return self._obj.decompress(data)
+
+    def decompress(self, data):
+        try:
+            return self._decompress(data)
+        except (zlib.error, getattr(brotli, "error", zlib.error)) as e:
+            raise ContentDecodingError("Corrupt %s response: %s" % (self.encoding, e))
+
+    def flush(self):
+        try:
+            return self._flush()
+        except (zlib.error, getattr(brotli, "error", zlib.error)) as e:
+            raise ContentDecodingError("Corrupt %s response: %s" % (self.encoding, e))
+
+    def _decompress(self, data):
+        if self.encoding == "identity":
+            return data
+        if self.encoding == "deflate" and self._obj is None:
+            return self._start_deflate(data)
+        if self.encoding == "br":
+            if hasattr(self._obj, "process"):
+                return self._obj.process(data)
+            return self._obj.decompress(data)
+        if self._trailer is not None:
+            return self._next_member(data)
+        out = self._obj.decompress(data)
+        if self._obj.eof:
+            out += self._next_member(self._obj.unused_data)
+        return out
+
+    def _next_member(self, data):
+        # Concatenated gzip members are valid; anything else after a complete
+        # member (servers pad with NULs) is ignored, as gzip(1) does.
+        if self._padding:
+            return b""
+        self._trailer = (self._trailer or b"") + data
+        if len(self._trailer) < 2:
+            return b""
+        if not self._trailer.startswith(b"\x1f\x8b"):
+            self._trailer = b""
+            self._padding = True
+            return b""
+        rest, self._trailer = self._trailer, None
+        self._obj = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        return self._decompress(rest)
+
+    def _flush(self):
+        if self.encoding == "deflate" and self._obj is None:
+            if not self._deflate_buffer:
+                return b""
+            self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+            data, self._deflate_buffer = self._deflate_buffer, b""
+            return self._obj.decompress(data) + self._obj.flush()
+        if self._trailer is not None:
+            return b""
+        if self._obj is not None and hasattr(self._obj, "flush"):
+            return self._obj.flush()
+        return b""
+
+
+def _iter_response_text(resp, chunk_size=FETCH_CHUNK_SIZE):
+    # Decompress and decode as the bytes arrive instead of buffering the whole body.
+    charset = resp.headers.get_content_charset() or "utf-8"
+    try:
+        decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    decompressor = _StreamDecompressor(resp.headers.get("Content-Encoding"))
+    while True:
+        chunk = resp.read(chunk_size)
+        if not chunk:
+            break
+        text = decoder.decode(decompressor.decompress(chunk))
+        if text:
+            yield text
+    text = decoder.decode(decompressor.flush(), final=True)
+    if text:
+        yield text
+
+
+def fetch_html(url):
+    headers = {
+        "User-Agent": "NVDA-Read-Later/0.1",
+        "Accept-Encoding": _accept_encoding(),
+    }
+    req = urllib.request.Request(url, headers=headers)
+    with urllib.request.urlopen(req, timeout=20) as resp:
+        # The cleaner needs the whole document, so the decoded chunks are
+        # joined here rather than fed to a parser as they arrive.
+        return "".join(_iter_response_text(resp))
+
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+XML_DECL = "<?xml version=\"1.0\" encoding=\"UTF-8\" standalone=\"yes\"?>"
+DOCX_HEADING_STYLES = {"h%d" % level: "Heading%d" % level for level in range(1, 7)}
+DOCX_HEADING_SIZES = (36, 30, 28, 26, 24, 22)
+DOCX_LIST_LEVELS = 6
+_XML_INVALID_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f￾￿]")
+
+
+def _xml_text(text):
+    # Page text can hold control characters that are not allowed in XML 1.0.
+    return xml_escape(_XML_INVALID_CHARS.sub("", text))
+
+
+class _DocxBodyWriter(HTMLParser):
+    """Stream cleaned article HTML into WordprocessingML paragraphs.
+
+    Only the paragraph being built is held in memory; each finished
+    paragraph is written straight to the output stream.
+    """
+
+    def __init__(self, stream):
+        super().__init__(convert_charrefs=True)
+        self.stream = stream
+        self.runs = []
+        self.text = []
+        self.bold = 0
+        self.italic = 0
+        self.code = 0
+        self.pre = 0
+        self.quote = 0
+        self.skip_depth = 0
+        self.heading = None
+        self.lists = []
+        self.num_ids = []
+        self.paragraph_count = 0
+
+    def _write(self, text):
+        self.stream.write(text.encode("utf-8"))
+
+    def _paragraph_properties(self):
+        props = []
+        if self.heading:
+            props.append("<w:pStyle w:val=\"%s\"/>" % DOCX_HEADING_STYLES[self.heading])
+        elif self.pre:
+            props.append("<w:pStyle w:val=\"Code\"/>")
+        elif self.lists:
+            props.append("<w:pStyle w:val=\"ListParagraph\"/>")
+            level = min(len(self.lists), DOCX_LIST_LEVELS) - 1
+            props.append("<w:numPr><w:ilvl w:val=\"%d\"/><w:numId w:val=\"%d\"/></w:numPr>" % (level, self.lists[-1]))
+        elif self.quote:
+            props.append("<w:pStyle w:val=\"Quote\"/>")
+        return "<w:pPr>%s</w:pPr>" % "".join(props) if props else ""
+
+    def flush_paragraph(self):
+        if not self.runs:
+            return
+        self._write("<w:p>%s%s</w:p>" % (self._paragraph_properties(), "".join(self.runs)))
+        self.runs = []
+        self.paragraph_count += 1
+
+    def _add_text(self, text):
+        props = []
+        if self.bold:
+            props.append("<w:b/>")
+        if self.italic:
+            props.append("<w:i/>")
+        if self.code or self.pre:
+            props.append("<w:rStyle w:val=\"CodeChar\"/>")
+        rpr = "<w:rPr>%s</w:rPr>" % "".join(props) if props else ""
+        lines = text.split("\n")
+        parts = []
+        for index, line in enumerate(lines):
+            if index:
+                parts.append("<w:br/>")
+            if line:
+                parts.append("<w:t xml:space=\"preserve\">%s</w:t>" % _xml_text(line))
+        if parts:
+            self.runs.append("<w:r>%s%s</w:r>" % (rpr, "".join(parts)))
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_text()
+        tag = tag.lower()
+        if tag in ("style", "script", "head", "title"):
+            self.skip_depth += 1
+            return
+        if self.skip_depth:
+            return
+        if tag == "br":
+            self.runs.append("<w:r><w:br/></w:r>")
+            return
+        if tag in BLOCK_TAGS:
+            self.flush_paragraph()
+        if tag in DOCX_HEADING_STYLES:
+            self.heading = tag
+        elif tag in ("strong", "b"):
+            self.bold += 1
+        elif tag in ("em", "i"):
+            self.italic += 1
+        elif tag == "code":
+            self.code += 1
+        elif tag == "pre":
+            self.pre += 1
+        elif tag == "blockquote":
+            self.quote += 1
+        elif tag == "ul":
+            self.lists.append(1)
+        elif tag == "ol":
+            self.num_ids.append(len(self.num_ids) + 2)
+            self.lists.append(self.num_ids[-1])
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag.lower() in ("style", "script", "head", "title"):
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        self._flush_text()
+        tag = tag.lower()
+        if tag in ("style", "script", "head", "title"):
+            if self.skip_depth:
+                self.skip_depth -= 1
+            return
+        if self.skip_depth:
+            return
+        if tag in BLOCK_TAGS:
+            self.flush_paragraph()
+        if tag == self.heading:
+            self.heading = None
+        elif tag in ("strong", "b"):
+            self.bold = max(0, self.bold - 1)
+        elif tag in ("em", "i"):
+            self.italic = max(0, self.italic - 1)
+        elif tag == "code":
+            self.code = max(0, self.code - 1)
+        elif tag == "pre":
+            self.pre = max(0, self.pre - 1)
+        elif tag == "blockquote":
+            self.quote = max(0, self.quote - 1)
+        elif tag in ("ul", "ol") and self.lists:
+            self.lists.pop()
+
+    def handle_data(self, data):
+        # A text node can arrive in pieces when the input is fed in chunks.
+        if not self.skip_depth:
+            self.text.append(data)
+
+    def _flush_text(self):
+        data = "".join(self.text)
+        self.text = []
+        if not data:
+            return
+        if not self.pre:
+            data = re.sub(r"\s+", " ", data)
+            if not data.strip():
+                return
+            # Adjacent text nodes in cleaned HTML lost their separating space.
+            data = data.strip()
+            if self.runs:
+                data = " " + data
+        self._add_text(data)
+
+    def close(self):
+        super().close()
+        self._flush_text()
+        self.flush_paragraph()
+
+
+def _docx_styles_xml():
+    headings = "".join(
+        "<w:style w:type=\"paragraph\" w:styleId=\"Heading%d\">"
+        "<w:name w:val=\"heading %d\"/><w:basedOn w:val=\"Normal\"/><w:next w:val=\"Normal\"/><w:qFormat/>"
+        "<w:pPr><w:keepNext/><w:spacing w:before=\"240\" w:after=\"60\"/><w:outlineLvl w:val=\"%d\"/></w:pPr>"
+        "<w:rPr><w:b/><w:sz w:val=\"%d\"/></w:rPr></w:style>" % (level, level, level - 1, DOCX_HEADING_SIZES[level - 1])
+        for level in range(1, 7)
+    )
+    return (
+        XML_DECL +
+        "<w:styles xmlns:w=\"%s\">"
+        "<w:docDefaults><w:rPrDefault><w:rPr><w:rFonts w:ascii=\"Calibri\" w:hAnsi=\"Calibri\"/>"
+        "<w:sz w:val=\"22\"/></w:rPr></w:rPrDefault>"
+        "<w:pPrDefault><w:pPr><w:spacing w:after=\"120\"/></w:pPr></w:pPrDefault></w:docDefaults>"
+        "<w:style w:type=\"paragraph\" w:default=\"1\" w:styleId=\"Normal\"><w:name w:val=\"Normal\"/><w:qFormat/></w:style>"
+        "%s"
+        "<w:style w:type=\"paragraph\" w:styleId=\"ListParagraph\"><w:name w:val=\"List Paragraph\"/>"
+        "<w:basedOn w:val=\"Normal\"/><w:pPr><w:contextualSpacing/></w:pPr></w:style>"
+        "<w:style w:type=\"paragraph\" w:styleId=\"Quote\"><w:name w:val=\"Quote\"/><w:basedOn w:val=\"Normal\"/>"
+        "<w:pPr><w:ind w:left=\"720\" w:right=\"720\"/></w:pPr><w:rPr><w:i/></w:rPr></w:style>"
+        "<w:style w:type=\"paragraph\" w:styleId=\"Code\"><w:name w:val=\"Code\"/><w:basedOn w:val=\"Normal\"/>"
+        "<w:pPr><w:spacing w:after=\"0\"/></w:pPr></w:style>"
+        "<w:style w:type=\"character\" w:styleId=\"CodeChar\"><w:name w:val=\"Code Char\"/>"
+        "<w:rPr><w:rFonts w:ascii=\"Consolas\" w:hAnsi=\"Consolas\"/></w:rPr></w:style>"
+        "</w:styles>" % (W_NS, headings)
+    )
+
+
+def _docx_numbering_xml(ordered_num_ids):
+    def levels(fmt):
+        out = []
+        for level in range(DOCX_LIST_LEVELS):
+            text = "•" if fmt == "bullet" else "%%%d." % (level + 1)
+            out.append(
+                "<w:lvl w:ilvl=\"%d\"><w:start w:val=\"1\"/><w:numFmt w:val=\"%s\"/>"
+                "<w:lvlText w:val=\"%s\"/><w:lvlJc w:val=\"left\"/>"
+                "<w:pPr><w:ind w:left=\"%d\" w:hanging=\"360\"/></w:pPr></w:lvl>"
+                % (level, fmt, text, 720 * (level + 1))
+            )
+        return "".join(out)
+
+    # Each ordered list gets its own instance so its numbering restarts at 1.
+    overrides = "".join(
+        "<w:lvlOverride w:ilvl=\"%d\"><w:startOverride w:val=\"1\"/></w:lvlOverride>" % level
+        for level in range(DOCX_LIST_LEVELS)
+    )
+    ordered = "".join(
+        "<w:num w:numId=\"%d\"><w:abstractNumId w:val=\"1\"/>%s</w:num>" % (num_id, overrides)
+        for num_id in ordered_num_ids
+    )
+    return (
+        XML_DECL +
+        "<w:numbering xmlns:w=\"%s\">"
+        "<w:abstractNum w:abstractNumId=\"0\">%s</w:abstractNum>"
+        "<w:abstractNum w:abstractNumId=\"1\">%s</w:abstractNum>"
+        "<w:num w:numId=\"1\"><w:abstractNumId w:val=\"0\"/></w:num>%s"
+        "</w:numbering>" % (W_NS, levels("bullet"), levels("decimal"), ordered)
+    )
+
+
+def _read_chunks(source, chunk_size=FETCH_CHUNK_SIZE):
+    # source is a string or a text file, which is read a chunk at a time.
+    if isinstance(source, str):
+        yield source
+        return
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def write_docx(html_source, dest_path, title=""):
+    """Write html_source (a string or a text file) as a DOCX document."""
+    content_types = (
+        XML_DECL +
+        "<Types xmlns=\"http://schemas.openxmlformats.org/package/2006/content-types\">"
+        "<Default Extension=\"rels\" ContentType=\"application/vnd.openxmlformats-package.relationships+xml\"/>"
+        "<Default Extension=\"xml\" ContentType=\"application/xml\"/>"
+        "<Override PartName=\"/word/document.xml\" "
+        "ContentType=\"application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml\"/>"
+        "<Override PartName=\"/word/styles.xml\" "
+        "ContentType=\"application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml\"/>"
+        "<Override PartName=\"/word/numbering.xml\" "
+        "ContentType=\"application/vnd.openxmlformats-officedocument.wordprocessingml.numbering+xml\"/>"
+        "<Override PartName=\"/docProps/core.xml\" "
+        "ContentType=\"application/vnd.openxmlformats-package.core-properties+xml\"/>"
+        "</Types>"
+    )
+    rels = (
+        XML_DECL +
+        "<Relationships xmlns=\"http://schemas.openxmlformats.org/package/2006/relationships\">"
+        "<Relationship Id=\"rId1\" "
+        "Type=\"http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument\" "
+        "Target=\"word/document.xml\"/>"
+        "<Relationship Id=\"rId2\" "
+        "Type=\"http://schemas.openxmlformats.org/package/2006/relationships/metadata/core-properties\" "
+        "Target=\"docProps/core.xml\"/>"
+        "</Relationships>"
+    )
+    document_rels = (
+        XML_DECL +
+        "<Relationships xmlns=\"http://schemas.openxmlformats.org/package/2006/relationships\">"
+        "<Relationship Id=\"rId1\" "
+        "Type=\"http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles\" Target=\"styles.xml\"/>"
+        "<Relationship Id=\"rId2\" "
+        "Type=\"http://schemas.openxmlformats.org/officeDocument/2006/relationships/numbering\" Target=\"numbering.xml\"/>"
+        "</Relationships>"
+    )
+    core = (
+        XML_DECL +
+        "<cp:coreProperties xmlns:cp=\"http://schemas.openxmlformats.org/package/2006/metadata/core-properties\" "
+        "xmlns:dc=\"http://purl.org/dc/elements/1.1/\"><dc:title>%s</dc:title></cp:coreProperties>"
+        % _xml_text(title or "Article")
+    )
+    with zipfile.ZipFile(dest_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", content_types)
+        zf.writestr("_rels/.rels", rels)
+        zf.writestr("docProps/core.xml", core)
+        with zf.open("word/document.xml", "w") as stream:
+            stream.write(("%s<w:document xmlns:w=\"%s\"><w:body>" % (XML_DECL, W_NS)).encode("utf-8"))
+            writer = _DocxBodyWriter(stream)
+            for chunk in _read_chunks(html_source):
+                writer.feed(chunk)
+            writer.close()
+            if not writer.paragraph_count:
+                stream.write(b"<w:p/>")
+            stream.write(b"<w:sectPr/></w:body></w:document>")
+        zf.writestr("word/styles.xml", _docx_styles_xml())
+        zf.writestr("word/numbering.xml", _docx_numbering_xml(writer.num_ids))
+        zf.writestr("word/_rels/document.xml.rels", document_rels)
+
+
+EPUB_SPLIT_TAGS = {"h1", "h2"}
+EPUB_CHAPTER_MIN_CHARS = 4000
+XHTML_NS = "http://www.w3.org/1999/xhtml"
+
+
+class _EpubChapterWriter(HTMLParser):
+    """Convert cleaned article HTML into well-formed XHTML chapters.
+
+    Chapters are streamed into the zip one at a time. A new chapter starts
+    at an h1/h2 once the current one holds EPUB_CHAPTER_MIN_CHARS of text,
+    and every heading is recorded for the navigation document.
+    """
+
+    def __init__(self, zf, title):
+        super().__init__(convert_charrefs=True)
+        self.zf = zf
+        self.title = title
+        self.stream = None
+        self.chapters = []
+        self.headings = []
+        self.stack = []
+        self.skip_depth = 0
+        self.chapter_chars = 0
+        self.heading_text = None
+        self.text = []
+
+    def _write(self, text):
+        self.stream.write(text.encode("utf-8"))
+
+    def _open_chapter(self):
+        name = "chapter%d.xhtml" % (len(self.chapters) + 1)
+        self.chapters.append(name)
+        self.stream = self.zf.open("OEBPS/" + name, "w")
+        self._write(
+            "<?xml version=\"1.0\" encoding=\"utf-8\"?>"
+            "<html xmlns=\"%s\" xmlns:epub=\"http://www.idpf.org/2007/ops\">"
+            "<head><title>%s</title><meta charset=\"utf-8\"/></head><body>" % (XHTML_NS, _xml_text(self.title))
+        )
+        for tag in self.stack:
+            self._write("<%s>" % tag)
+        self.chapter_chars = 0
+
+    def _close_chapter(self):
+        for tag in reversed(self.stack):
+            self._write("</%s>" % tag)
+        self._write("</body></html>")
+        self.stream.close()
+        self.stream = None
+
+    def _close_until(self, tag):
+        while self.stack:
+            open_tag = self.stack.pop()
+            if self.heading_text is not None and open_tag.startswith("h") and open_tag[1:].isdigit():
+                self.headings[-1][1] = re.sub(r"\s+", " ", " ".join(self.heading_text)).strip()
+                self.heading_text = None
+            self._write("</%s>" % open_tag)
+            if open_tag == tag:
+                break
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_text()
+        tag = tag.lower()
+        if tag in SKIP_TAGS or tag in ("head", "title"):
+            self.skip_depth += 1
+            return
+        if self.skip_depth:
+            return
+        tag = "span" if tag == "a" else TAG_MAP.get(tag, tag)
+        if tag not in ALLOWED_TAGS and tag != "span":
+            return
+        if tag in BLOCK_TAGS and "p" in self.stack:
+            # Block content implicitly ends an open paragraph, as in HTML.
+            self._close_until("p")
+        if tag in EPUB_SPLIT_TAGS and self.chapter_chars >= EPUB_CHAPTER_MIN_CHARS:
+            self._close_chapter()
+            self._open_chapter()
+        if tag == "br":
+            self._write("<br/>")
+            return
+        if tag.startswith("h") and tag[1:].isdigit():
+            heading_id = "h%d" % (len(self.headings) + 1)
+            self.headings.append([int(tag[1]), "", self.chapters[-1], heading_id])
+            self.heading_text = []
+            self._write("<%s id=\"%s\">" % (tag, heading_id))
+        else:
+            self._write("<%s>" % tag)
+        self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush_text()
+        tag = tag.lower()
+        if tag in SKIP_TAGS or tag in ("head", "title"):
+            return
+        self.handle_starttag(tag, attrs)
+        if tag != "br":
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        self._flush_text()
+        tag = tag.lower()
+        if tag in SKIP_TAGS or tag in ("head", "title"):
+            if self.skip_depth:
+                self.skip_depth -= 1
+            return
+        if self.skip_depth:
+            return
+        tag = "span" if tag == "a" else TAG_MAP.get(tag, tag)
+        if tag not in self.stack:
+            return
+        self._close_until(tag)
+
+    def handle_data(self, data):
+        # A text node can arrive in pieces when the input is fed in chunks.
+        if not self.skip_depth:
+            self.text.append(data)
+
+    def _flush_text(self):
+        data = "".join(self.text)
+        self.text = []
+        if not data.strip() and "pre" not in self.stack:
+            return
+        if self.heading_text is not None:
+            self.heading_text.append(data)
+        self.chapter_chars += len(data)
+        self._write(_xml_text(data))
+
+    def feed_document(self, html_source):
+        self._open_chapter()
+        for chunk in _read_chunks(html_source):
+            self.feed(chunk)
+        self.close()
+        self._flush_text()
+        while self.stack:
+            self._close_until(self.stack[-1])
+        self._close_chapter()
+
+
+def _epub_nav_xhtml(title, headings):
+    parts = []
+    levels = []
+    for level, text, chapter, heading_id in headings:
+        item = "<li><a href=\"%s#%s\">%s</a>" % (chapter, heading_id, _xml_text(text or title))
+        if not levels or level > levels[-1]:
+            parts.append("<ol>")
+            levels.append(level)
+        else:
+            parts.append("</li>")
+            while len(levels) > 1 and level < levels[-1]:
+                parts.append("</ol></li>")
+                levels.pop()
+        parts.append(item)
+    if levels:
+        parts.append("</li>" + "</ol></li>" * (len(levels) - 1) + "</ol>")
+    else:
+        parts.append("<ol><li><a href=\"chapter1.xhtml\">%s</a></li></ol>" % _xml_text(title))
+    return (
+        "<?xml version=\"1.0\" encoding=\"utf-8\"?>"
+        "<html xmlns=\"%s\" xmlns:epub=\"http://www.idpf.org/2007/ops\">"
+        "<head><title>%s</title><meta charset=\"utf-8\"/></head>"
+        "<body><nav epub:type=\"toc\" id=\"toc\"><h1>%s</h1>%s</nav></body></html>"
+        % (XHTML_NS, _xml_text(title), _xml_text(title), "".join(parts))
+    )
+
+
+def _epub_toc_ncx(title, book_id, headings):
+    parts = []
+    levels = []
+    for order, (level, text, chapter, heading_id) in enumerate(headings, 1):
+        while levels and level <= levels[-1]:
+            parts.append("</navPoint>")
+            levels.pop()
+        parts.append(
+            "<navPoint id=\"nav%d\" playOrder=\"%d\"><navLabel><text>%s</text></navLabel>"
+            "<content src=\"%s#%s\"/>" % (order, order, _xml_text(text or title), chapter, heading_id)
+        )
+        levels.append(level)
+    parts.append("</navPoint>" * len(levels))
+    if not headings:
+        parts.append(
+            "<navPoint id=\"nav1\" playOrder=\"1\"><navLabel><text>%s</text></navLabel>"
+            "<content src=\"chapter1.xhtml\"/></navPoint>" % _xml_text(title)
+        )
+    return (
+        "<?xml version=\"1.0\" encoding=\"utf-8\"?>"
+        "<ncx xmlns=\"http://www.daisy.org/z3986/2005/ncx/\" version=\"2005-1\">"
+        "<head><meta name=\"dtb:uid\" content=\"urn:uuid:%s\"/></head>"
+        "<docTitle><text>%s</text></docTitle><navMap>%s</navMap></ncx>"
+        % (book_id, _xml_text(title), "".join(parts))
+    )
+
+
+def write_epub(html_source, dest_path, title=""):
+    """Write html_source (a string or a text file) as an EPUB 3 book."""
+    if not title:
+        title = "Article"
+    book_id = uuid.uuid4()
+    container_xml = (
+        "<?xml version=\"1.0\"?>"
+        "<container version=\"1.0\" xmlns=\"urn:oasis:names:tc:opendocument:xmlns:container\">"
+        "<rootfiles><rootfile full-path=\"OEBPS/content.opf\" media-type=\"application/oebps-package+xml\"/>"
+        "</rootfiles></container>"
+    )
+    with zipfile.ZipFile(dest_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        # epub requires uncompressed mimetype first
+        zf.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        zf.writestr("META-INF/container.xml", container_xml)
+        writer = _EpubChapterWriter(zf, title)
+        writer.feed_document(html_source)
+        manifest_items = "".join(
+            "<item id=\"c%d\" href=\"%s\" media-type=\"application/xhtml+xml\"/>" % (index, name)
+            for index, name in enumerate(writer.chapters, 1)
+        )
+        spine_items = "".join("<itemref idref=\"c%d\"/>" % index for index in range(1, len(writer.chapters) + 1))
+        content_opf = (
+            "<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+            "<package xmlns=\"http://www.idpf.org/2007/opf\" unique-identifier=\"BookId\" version=\"3.0\">"
+            "<metadata xmlns:dc=\"http://purl.org/dc/elements/1.1/\">"
+            "<dc:title>%s</dc:title>"
+            "<dc:language>en</dc:language>"
+            "<dc:identifier id=\"BookId\">urn:uuid:%s</dc:identifier>"
+            "<meta property=\"dcterms:modified\">%s</meta>"
+            "</metadata>"
+            "<manifest>"
+            "<item id=\"nav\" href=\"nav.xhtml\" media-type=\"application/xhtml+xml\" properties=\"nav\"/>"
+            "<item id=\"ncx\" href=\"toc.ncx\" media-type=\"application/x-dtbncx+xml\"/>"
+            "%s"
+            "</manifest>"
+            "<spine toc=\"ncx\">%s</spine>"
+            "</package>" % (
+                _xml_text(title), book_id,
+                datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                manifest_items, spine_items,
+            )
+        )
+        zf.writestr("OEBPS/nav.xhtml", _epub_nav_xhtml(title, writer.headings))
+        zf.writestr("OEBPS/toc.ncx", _epub_toc_ncx(title, book_id, writer.headings))
+        zf.writestr("OEBPS/content.opf", content_opf)
+
+
+EXPORT_FORMATS = {".html": "html", ".txt": "txt", ".md": "md", ".docx": "docx", ".epub": "epub"}
+
+
+def export_record(record, dest_path, format_name):
+    # Copy and convert from the stored files without reading them whole.
+    html_path, text_path = article_paths(record)
+    if format_name == "html":
+        shutil.copyfile(html_path, dest_path)
+    elif format_name == "txt":
+        shutil.copyfile(text_path, dest_path)
+    elif format_name == "md":
+        with open(text_path, "r", encoding="utf-8", newline="") as src, \
+                open(dest_path, "w", encoding="utf-8", newline="") as f:
+            f.write("# %s\n\n" % record.get("title", "Article"))
+            shutil.copyfileobj(src, f, FETCH_CHUNK_SIZE)
+    elif format_name in ("docx", "epub"):
+        writer = write_docx if format_name == "docx" else write_epub
+        with open(html_path, "r", encoding="utf-8") as f:
+            writer(f, dest_path, record.get("title", ""))
+    else:
+        raise ValueError("Unsupported export format: %s" % format_name)
+
+
+def safe_file_name(title):
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", title or "article")
+
+
+def infer_title_from_html(html):
+    title = htmlScan.find_element_content(html, "title")
+    if title is not None:
+        text = re.sub(r"\s+", " ", title)
+        return text.strip()
+    return ""
+
+
+def make_plain_html(title, url, html):
+    # When formatting is not preserved, keep only plain text.
+    text = strip_tags(html)
+    body = "<h1>%s</h1>" % escape(title or "Article")
+    if url:
+        body += "<p><strong>Source:</strong> %s</p>" % escape(url)
+    body += "<pre>%s</pre>" % escape(text)
+    return "<html><head><meta charset=\"utf-8\"/></head><body>%s</body></html>" % body
+
+
+def strip_tags(html):
+    # Tolerates malformed closing tags like </script\t\n foo>.
+    return htmlScan.strip_tags(html)
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""Bitmap indexes over tags, folders and read/archived state.
+
+Every record gets a slot number; each facet (``tag:python``,
+``folder:work``, ``state:unread``, ...) is a Python int with one bit per
+slot, so filters are a few integer ANDs and ORs however large the
+library is.
+"""
+import json
+import os
+import re
+
+FACETS_VERSION = 1
+STATE_WORDS = ("read", "unread", "archived")
+OPERATORS = ("AND", "OR", "NOT")
+
+_QUERY_TOKEN_RE = re.compile(r"\(|\)|(?:[^\s()\"]|\"[^\"]*\")+")
+
+
+def normalize_tag(tag):
+    return re.sub(r"\s+", " ", tag).strip().lower()
+
+
+def record_keys(record):
+    """Return the facet keys a record belongs to."""
+    keys = {"tag:" + normalize_tag(tag) for tag in record.get("tags", ()) if normalize_tag(tag)}
+    folder = record.get("folder", "").strip()
+    if folder:
+        keys.add("folder:" + folder.lower())
+    keys.add("state:read" if record.get("read") else "state:unread")
+    if record.get("archived"):
+        keys.add("state:archived")
+    return keys
+
+
+class FacetIndex:
+    def __init__(self):
+        self.slots = []
+        self.slot_of = {}
+        self.bitmaps = {}
+
+    @classmethod
+    def build(cls, records):
+        index = cls()
+        for record in records:
+            index.add(record)
+        return index
+
+    @classmethod
+    def load(cls, path, records):
+        """Load the index at path, rebuilding it if it does not match records."""
+        data = None
+        if os.path.isfile(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = None
+        if not isinstance(data, dict) or data.get("version") != FACETS_VERSION:
+            return cls.build(records)
+        index = cls()
+        index.slots = data.get("slots", [])
+        index.slot_of = {record_id: slot for slot, record_id in enumerate(index.slots) if record_id}
+        if set(index.slot_of) != {record.get("id") for record in records}:
+            return cls.build(records)
+        index.bitmaps = {key: int(value, 16) for key, value in data.get("bitmaps", {}).items()}
+        return index
+
+    def save(self, path):
+        data = {
+            "version": FACETS_VERSION,
+            "slots": self.slots,
+            "bitmaps": {key: "%x" % bits for key, bits in self.bitmaps.items() if bits},
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _allocate(self, record_id):
+        for slot, current in enumerate(self.slots):
+            if current is None:
+                self.slots[slot] = record_id
+                return slot
+        self.slots.append(record_id)
+        return len(self.slots) - 1
+
+    def add(self, record):
+        record_id = record["id"]
+        if record_id in self.slot_of:
+            self.update(record)
+            return
+        slot = self._allocate(record_id)
+        self.slot_of[record_id] = slot
+        bit = 1 << slot
+        for key in record_keys(record):
+            self.bitmaps[key] = self.bitmaps.get(key, 0) | bit
+
+    def remove(self, record_id):
+        slot = self.slot_of.pop(record_id, None)
+        if slot is None:
+            return
+        self.slots[slot] = None
+        mask = ~(1 << slot)
+        for key in list(self.bitmaps):
+            self.bitmaps[key] &= mask
+            if not self.bitmaps[key]:
+                del self.bitmaps[key]
+        while self.slots and self.slots[-1] is None:
+            self.slots.pop()
+
+    def update(self, record):
+        slot = self.slot_of.get(record["id"])
+        if slot is None:
+            self.add(record)
+            return
+        bit = 1 << slot
+        keys = record_keys(record)
+        for key in list(self.bitmaps):
+            if key not in keys and self.bitmaps[key] & bit:
+                self.bitmaps[key] &= ~bit
+                if not self.bitmaps[key]:
+                    del self.bitmaps[key]
+        for key in keys:
+            self.bitmaps[key] = self.bitmaps.get(key, 0) | bit
+
+    def all_bits(self):
+        bits = 0
+        for slot in self.slot_of.values():
+            bits |= 1 << slot
+        return bits
+
+    def ids(self, bits):
+        result = set()
+        while bits:
+            low = bits & -bits
+            result.add(self.slots[low.bit_length() - 1])
+            bits ^= low
+        return result
+
+
+def is_filter_query(query):
+    """Tell whether query uses filter syntax rather than being plain text.
+
+    Only explicit syntax counts: is:STATE, tag:, folder: or an uppercase
+    AND, OR or NOT. "How to read code" stays a plain search.
+    """
+    for token in _QUERY_TOKEN_RE.findall(query):
+        if token in OPERATORS or token.lower().startswith(("is:", "tag:", "folder:")):
+            return True
+    return False
+
+
+def _term_bits(index, term, records):
+    lowered = term.lower()
+    if lowered.startswith("is:") and lowered[3:] in STATE_WORDS:
+        return index.bitmaps.get("state:" + lowered[3:], 0)
+    for prefix in ("tag:", "folder:"):
+        if lowered.startswith(prefix):
+            value = lowered[len(prefix):]
+            if prefix == "tag:":
+                value = normalize_tag(value)
+            return index.bitmaps.get(prefix + value, 0)
+    # Anything else is a plain text match on the title or URL.
+    bits = 0
+    for record in records:
+        if lowered in record.get("title", "").lower() or lowered in record.get("url", "").lower():
+            slot = index.slot_of.get(record.get("id"))
+            if slot is not None:
+                bits |= 1 << slot
+    return bits
+
+
+def evaluate(index, query, records):
+    """Evaluate a filter query to a bitmap of matching slots.
+
+    Terms are is:read, is:unread, is:archived, tag:NAME, folder:NAME or
+    free text; quote values with spaces (tag:"machine learning"). Terms
+    combine with NOT, AND and OR (uppercase) in that order of precedence,
+    AND is implied between adjacent terms, and parentheses group.
+    """
+    tokens = []
+    for token in _QUERY_TOKEN_RE.findall(query):
+        tokens.append(token.replace("\"", ""))
+    all_bits = index.all_bits()
+    pos = [0]
+
+    def peek():
+        return tokens[pos[0]] if pos[0] < len(tokens) else None
+
+    def take():
+        pos[0] += 1
+        return tokens[pos[0] - 1]
+
+    def parse_or():
+        bits = parse_and()
+        while peek() == "OR":
+            take()
+            bits |= parse_and()
+        return bits
+
+    def parse_and():
+        bits = parse_not()
+        while peek() is not None and peek() not in (")", "OR"):
+            if peek() == "AND":
+                take()
+            bits &= parse_not()
+        return bits
+
+    def parse_not():
+        if peek() == "NOT":
+            take()
+            return all_bits & ~parse_not()
+        return parse_term()
+
+    def parse_term():
+        token = peek()
+        if token is None:
+            return all_bits
+        take()
+        if token == "(":
+            bits = parse_or()
+            if peek() == ")":
+                take()
+            return bits
+        if token == ")":
+            return all_bits
+        return _term_bits(index, token, records)
+
+    if not tokens:
+        return all_bits
+    bits = parse_or()
+    # An unbalanced ")" ends parse_or early; AND in whatever follows it.
+    while pos[0] < len(tokens):
+        if peek() == ")":
+            take()
+            continue
+        bits &= parse_or()
+    return bits
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""Linear-time HTML scanning used for plain text and sanitizing.
+
+Regexes such as ``<script\\b[^>]*>.*?</script>`` rescan the rest of the
+document for every unterminated match, which is quadratic on malformed
+pages. The scanner here moves forward only: every search remembers its
+last answer, so each character is examined a bounded number of times.
+"""
+import re
+
+RAW_TEXT_TAGS = frozenset({"script", "style", "noscript", "iframe", "svg", "canvas", "textarea", "title", "xmp"})
+
+_TAG_NAME_RE = re.compile(r"[A-Za-z][^\s/>]*")
+_ATTR_RE = re.compile(r"[\s/]*([^\s\"'>/=]+)?(\s*=\s*)?")
+_UNQUOTED_RE = re.compile(r"[^\s>]*")
+_SPACE_RE = re.compile(r"\s+")
+# str.lower() can change the length of non-ASCII text, which would break the
+# offsets shared between the original and the lowered copy.
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+class _Finder:
+    """str.find that never scans the same stretch twice for one needle.
+
+    Valid only while the start positions passed in never decrease, which
+    is how the scanner uses it.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self._cache = {}
+
+    def find(self, needle, pos):
+        cached = self._cache.get(needle)
+        if cached is not None:
+            start, found = cached
+            if pos >= start and (found == -1 or found >= pos):
+                return found
+        found = self.text.find(needle, pos)
+        self._cache[needle] = (pos, found)
+        return found
+
+
+class Token:
+    __slots__ = ("kind", "start", "end", "name", "attrs", "self_closing")
+
+    def __init__(self, kind, start, end, name="", attrs=(), self_closing=False):
+        # kind is "text", "start", "end", "raw" (content of a raw text
+        # element) or "other" (comments, doctypes, processing instructions).
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.name = name
+        self.attrs = attrs
+        self.self_closing = self_closing
+
+
+def _scan_attrs(html, pos, finder):
+    """Parse attributes from pos; return (attrs, tag_end, self_closing).
+
+    attrs is a list of (lowercase name, start, end) slices of html.
+    """
+    n = len(html)
+    attrs = []
+    while pos < n:
+        match = _ATTR_RE.match(html, pos)
+        name, equals = match.group(1), match.group(2)
+        attr_start = match.start(1) if name else match.end()
+        pos = match.end()
+        if pos >= n:
+            break
+        ch = html[pos]
+        if equals:
+            if ch in "\"'":
+                close = finder.find(ch, pos + 1)
+                if close == -1:
+                    # Unbalanced quote: end the tag at the next ">" instead.
+                    gt = finder.find(">", pos)
+                    if name:
+                        attrs.append((name.lower(), attr_start, gt if gt != -1 else n))
+                    return attrs, (gt + 1 if gt != -1 else n), False
+                pos = close + 1
+            else:
+                pos = _UNQUOTED_RE.match(html, pos).end()
+            if name:
+                attrs.append((name.lower(), attr_start, pos))
+            continue
+        if name:
+            attrs.append((name.lower(), attr_start, pos))
+            continue
+        if ch == ">":
+            self_closing = html[pos - 1] == "/"
+            return attrs, pos + 1, self_closing
+        # Stray quote or "=": skip it so the scan always advances.
+        pos += 1
+    return attrs, n, False
+
+
+def iter_tokens(html, raw_tags=RAW_TEXT_TAGS):
+    """Yield Tokens covering html from start to end, in order.
+
+    The content of elements named in raw_tags is not parsed for markup and
+    is yielded as a single "raw" token.
+    """
+    n = len(html)
+    lower = html.translate(_ASCII_LOWER)
+    finder = _Finder(html)
+    lower_finder = _Finder(lower)
+    pos = 0
+    while pos < n:
+        lt = finder.find("<", pos)
+        if lt == -1:
+            yield Token("text", pos, n)
+            return
+        if lt > pos:
+            yield Token("text", pos, lt)
+        nxt = html[lt + 1:lt + 2]
+        if html.startswith("<!--", lt):
+            close = finder.find("-->", lt + 4)
+            end = n if close == -1 else close + 3
+            yield Token("other", lt, end)
+            pos = end
+            continue
+        if nxt in ("!", "?"):
+            gt = finder.find(">", lt)
+            end = n if gt == -1 else gt + 1
+            yield Token("other", lt, end)
+            pos = end
+            continue
+        is_end = nxt == "/"
+        match = _TAG_NAME_RE.match(html, lt + (2 if is_end else 1))
+        if not match:
+            # A "<" that does not open a tag is ordinary text.
+            yield Token("text", lt, lt + 1)
+            pos = lt + 1
+            continue
+        name = match.group(0).lower()
+        if is_end:
+            gt = finder.find(">", match.end())
+            end = n if gt == -1 else gt + 1
+            yield Token("end", lt, end, name)
+            pos = end
+            continue
+        attrs, end, self_closing = _scan_attrs(html, match.end(), finder)
+        yield Token("start", lt, end, name, attrs, self_closing)
+        pos = end
+        if name in raw_tags and not self_closing:
+            close_start, close_end = _find_raw_end(lower, name, end, lower_finder)
+            if close_start > end:
+                yield Token("raw", end, close_start, name)
+            if close_end > close_start:
+                yield Token("end", close_start, close_end, name)
+            pos = close_end
+
+
+def _find_raw_end(lower, name, pos, finder):
+    """Locate the end tag closing a raw text element such as <script>.
+
+    Tolerates junk before the ">" (</script\t\n foo>). An unclosed element
+    runs to the end of the document, as it does in browsers.
+    """
+    n = len(lower)
+    needle = "</" + name
+    while True:
+        start = finder.find(needle, pos)
+        if start == -1:
+            return n, n
+        after = start + len(needle)
+        if after >= n or not (lower[after].isalnum() or lower[after] in "_-:"):
+            gt = finder.find(">", after)
+            return start, (n if gt == -1 else gt + 1)
+        pos = after
+
+
+def strip_tags(html, drop=("script", "style")):
+    """Return the text of html with tags removed and whitespace collapsed.
+
+    The contents of the elements named in drop are removed as well.
+    """
+    parts = []
+    for token in iter_tokens(html, frozenset(drop)):
+        if token.kind == "text":
+            parts.append(html[token.start:token.end])
+        else:
+            parts.append(" ")
+    return _SPACE_RE.sub(" ", "".join(parts)).strip()
+
+
+def sanitize(html, drop=("script", "style", "noscript", "iframe", "svg", "canvas")):
+    """Remove active elements and on* event handler attributes from html."""
+    drop = frozenset(drop)
+    out = []
+    for token in iter_tokens(html, drop):
+        if token.kind == "raw":
+            continue
+        if token.kind == "start":
+            if token.name in drop:
+                continue
+            kept = [
+                html[start:end] for name, start, end in token.attrs
+                if not name.startswith("on")
+            ]
+            out.append("<" + token.name)
+            for attr in kept:
+                out.append(" " + attr)
+            out.append(" />" if token.self_closing else ">")
+        elif token.kind == "end" and token.name in drop:
+            continue
+        elif token.kind == "text" and html[token.start] == "<":
+            # Escape stray "<" so removing an element cannot splice a new tag.
+            out.append("&lt;")
+        else:
+            out.append(html[token.start:token.end])
+    return "".join(out)
+
+
+def find_element_content(html, tag):
+    """Return the inner HTML of the first <tag>...</tag>, or None."""
+    lower = html.translate(_ASCII_LOWER)
+    finder = _Finder(lower)
+    open_tag = "<" + tag
+    pos = 0
+    n = len(lower)
+    while True:
+        start = finder.find(open_tag, pos)
+        if start == -1:
+            return None
+        after = start + len(open_tag)
+        if after < n and (lower[after].isalnum() or lower[after] == "_"):
+            pos = after
+            continue
+        gt = finder.find(">", after)
+        if gt == -1:
+            return None
+        close = finder.find("</%s>" % tag, gt + 1)
+        if close == -1:
+            return None
+        return html[gt + 1:close]
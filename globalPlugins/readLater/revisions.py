@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""Delta-compressed revision history of an article's text.
+
+A history is a list of revisions. Every KEYFRAME_EVERY-th revision (and
+the first) stores the full text; the others store a line delta against
+the revision before them, so many revisions of a page cost little more
+than one copy.
+"""
+import difflib
+import gzip
+import json
+import os
+from html import escape
+
+KEYFRAME_EVERY = 10
+
+
+def make_delta(old_lines, new_lines):
+    """Encode new_lines as ops against old_lines.
+
+    Ops are [n] to copy n lines, [-n] to skip n lines and a list of
+    strings to insert them.
+    """
+    ops = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i2 - i1])
+            continue
+        if i2 > i1:
+            ops.append([-(i2 - i1)])
+        if j2 > j1:
+            ops.append(["+"] + new_lines[j1:j2])
+    return ops
+
+
+def apply_delta(old_lines, ops):
+    new_lines = []
+    pos = 0
+    for op in ops:
+        if op and op[0] == "+":
+            new_lines.extend(op[1:])
+        elif op[0] >= 0:
+            new_lines.extend(old_lines[pos:pos + op[0]])
+            pos += op[0]
+        else:
+            pos -= op[0]
+    return new_lines
+
+
+def load_history(path):
+    if not os.path.isfile(path):
+        return []
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def save_history(path, history):
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump(history, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def text_at(history, number):
+    """Rebuild the text of revision number (1-based)."""
+    index = number - 1
+    start = index
+    while "text" not in history[start]:
+        start -= 1
+    lines = history[start]["text"].split("\n")
+    for revision in history[start + 1:index + 1]:
+        lines = apply_delta(lines, revision["delta"])
+    return "\n".join(lines)
+
+
+def append_revision(history, text, date, previous_text=None):
+    """Add text as the next revision and return its number.
+
+    previous_text, when given, must be the text of the last revision; it
+    saves rebuilding it from the deltas.
+    """
+    number = len(history) + 1
+    revision = {"date": date}
+    if not history or (number - 1) % KEYFRAME_EVERY == 0:
+        revision["text"] = text
+    else:
+        if previous_text is None:
+            previous_text = text_at(history, len(history))
+        revision["delta"] = make_delta(previous_text.split("\n"), text.split("\n"))
+    history.append(revision)
+    return number
+
+
+def diff_html(old_text, new_text, title):
+    """Return an HTML page listing what changed between two texts."""
+    old_lines = old_text.split("\n")
+    new_lines = new_text.split("\n")
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    parts = ["<h1>%s</h1>" % escape(title)]
+    changes = 0
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        changes += 1
+        parts.append("<h2>Change %d</h2>" % changes)
+        removed = [line for line in old_lines[i1:i2] if line.strip()]
+        added = [line for line in new_lines[j1:j2] if line.strip()]
+        if removed:
+            parts.append("<p><strong>Removed:</strong></p><blockquote>%s</blockquote>" % "".join(
+                "<p><del>%s</del></p>" % escape(line) for line in removed
+            ))
+        if added:
+            parts.append("<p><strong>Added:</strong></p><blockquote>%s</blockquote>" % "".join(
+                "<p><ins>%s</ins></p>" % escape(line) for line in added
+            ))
+    if not changes:
+        parts.append("<p>No changes.</p>")
+    return "<html><head><meta charset=\"utf-8\"/><title>%s</title></head><body>%s</body></html>" % (
+        escape(title), "".join(parts),
+    )
@@ -0,0 +1,28 @@
+"""Run the Read Later engine from the command line, without NVDA.
+
+    python readlater_cli.py --library PATH save URL [URL ...]
+    python readlater_cli.py --library PATH search TERM
+    python -m cProfile -s cumtime readlater_cli.py --library PATH reindex
+
+See ``python readlater_cli.py --help`` for every command.
+"""
+import os
+import sys
+import types
+
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "globalPlugins", "readLater")
+
+
+def _load_engine_package():
+    # Register the add-on package without running its __init__, which
+    # imports NVDA. The engine modules only use relative imports.
+    package = types.ModuleType("readLater")
+    package.__path__ = [PACKAGE_DIR]
+    sys.modules["readLater"] = package
+
+
+if __name__ == "__main__":
+    _load_engine_package()
+    from readLater import cli
+
+    sys.exit(cli.main())
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import readlater_cli  # noqa: E402
+
+readlater_cli._load_engine_package()
+
+from readLater import core  # noqa: E402
+
+
+@pytest.fixture
+def library(tmp_path):
+    core.set_data_dir(str(tmp_path / "readLater"))
+    return tmp_path / "readLater"
@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+from readLater import core
+
+
+def _save(url, text):
+    html = core.make_plain_html("T", url, text)
+    return core.store_article("T", url, html, core.html_to_text(html))[0]
+
+
+def test_interrupted_backup_resumes(library, tmp_path, monkeypatch):
+    for number in range(4):
+        _save("http://example.com/%d" % number, "Article number %d." % number)
+    backup_dir = str(tmp_path / "backup")
+    monkeypatch.setattr(core, "BACKUP_SAVE_EVERY", 1)
+    copy_atomic = core._copy_atomic
+    calls = []
+
+    def failing_copy(src, dest):
+        calls.append(src)
+        if len(calls) == 5:
+            raise OSError("disk full")
+        copy_atomic(src, dest)
+
+    monkeypatch.setattr(core, "_copy_atomic", failing_copy)
+    with pytest.raises(OSError):
+        core.backup_library(backup_dir)
+    monkeypatch.setattr(core, "_copy_atomic", copy_atomic)
+    copied, skipped, removed = core.backup_library(backup_dir)
+    # 4 articles of 3 files each plus the index; the first 4 copies are kept.
+    assert (copied, skipped, removed) == (9, 4, 0)
+    assert core.backup_library(backup_dir) == (0, 13, 0)
+
+
+def test_restore_keeps_newer_articles(library, tmp_path):
+    old = _save("http://example.com/old", "Old article.")
+    backup_dir = str(tmp_path / "backup")
+    core.backup_library(backup_dir)
+    new = _save("http://example.com/new", "New article.")
+    core.delete_record(old)
+    core.restore_library(backup_dir)
+    assert [r["id"] for r in core.load_index()] == [new["id"], old["id"]]
+    assert all(os.path.isfile(p) for p in core.article_paths(old))
+    assert not core.check_integrity(full=True)["orphans"]
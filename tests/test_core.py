@@ -0,0 +1,115 @@
+import gzip
+import os
+
+import pytest
+
+from readLater import core, revisions
+
+
+def _save(url, lines, title="Article"):
+    html = core.make_plain_html(title, url, "\n".join(lines))
+    return core.store_article(title, url, html, core.html_to_text(html))
+
+
+def test_store_article_statuses(library):
+    body = ["Some article text about fingerprints and duplicates."]
+    record, status, duplicate = _save("http://example.com/a", body)
+    assert (status, duplicate) == ("new", None)
+
+    copy, status, duplicate = _save("http://mirror.example.org/a", body)
+    assert status == "duplicate"
+    assert duplicate["id"] == record["id"]
+    assert core.content_id(copy) == core.content_id(record)
+
+    same, status, _duplicate = _save("http://example.com/a#top", body)
+    assert (status, same["id"]) == ("unchanged", record["id"])
+
+    revised, status, _duplicate = _save("http://example.com/a", body + ["An added paragraph."])
+    assert (status, revised["id"], revised["revisions"]) == ("revision", record["id"], 2)
+    assert not revised["read"]
+    # The duplicate still shares the original files.
+    assert all(os.path.isfile(p) for p in core.article_paths(copy))
+    assert len(core.load_index()) == 2
+
+
+def test_near_duplicate_keeps_its_own_text(library):
+    words = ["word%d" % i for i in range(2000)]
+    first, _status, _duplicate = _save("http://a.com/x", [" ".join(words)])
+    words[1000] = "changed"
+    second, status, duplicate = _save("http://b.com/y", [" ".join(words)])
+    assert (status, duplicate["id"], second["duplicateOf"]) == ("near-duplicate", first["id"], first["id"])
+    assert core.content_id(second) != core.content_id(first)
+    with open(core.article_paths(second)[1], encoding="utf-8") as f:
+        text = f.read()
+    assert "changed" in text and "http://b.com/y" in text
+    assert _save("http://b.com/y", [" ".join(words)])[1] == "unchanged"
+
+
+def test_compact_merges_onto_an_intact_copy(library):
+    first, _status, _duplicate = _save("http://example.com/e", ["Same text."])
+    second, _status, _duplicate = _save("http://example.com/f", ["Other text."])
+    # Give both records the same content, then lose the older copy.
+    records = core.load_index()
+    for record in records:
+        record["contentHash"] = "same"
+    core.save_index(records)
+    for path in core.article_paths(first):
+        os.remove(path)
+    removed, merged = core.compact_library()
+    assert merged == 1
+    assert {core.content_id(r) for r in core.load_index()} == {core.content_id(second)}
+    report = core.check_integrity(full=True)
+    assert not report["missing"] and len(core.load_index()) == 2
+
+
+def test_changes_since_read(library):
+    record, _status, _duplicate = _save("http://example.com/b", ["First version."])
+    record = core.update_record(record["id"], read=True)
+    assert core.changes_since_read(record) is None
+    record, _status, _duplicate = _save("http://example.com/b", ["Second version."])
+    changes = core.changes_since_read(record)
+    assert "First version." in changes and "Second version." in changes
+    record = core.update_record(record["id"], read=True)
+    assert core.changes_since_read(record) is None
+
+
+def test_revision_delta_ignores_rewritten_text(library):
+    record, _status, _duplicate = _save("http://example.com/c", ["real line 1", "real line 2"])
+    _save("http://example.com/c", ["on screen line A"])
+    _html_path, text_path = core.article_paths(core.load_index()[0])
+    with open(text_path, "w", encoding="utf-8") as f:
+        f.write("rewritten by a repair")
+    _save("http://example.com/c", ["real line 1", "real line 3"])
+    history = revisions.load_history(core.history_path(record))
+    with open(core.article_paths(core.load_index()[0])[1], encoding="utf-8") as f:
+        assert revisions.text_at(history, 3) == f.read()
+
+
+def test_integrity_check_clean_after_fallback_save(library):
+    _save("http://example.com/d", ["on screen line A", "on screen line B"])
+    report = core.check_integrity(full=True)
+    assert not report["rebuilt"] and not report["recounted"] and not report["orphans"]
+
+
+def test_integrity_check_rebuilds_missing_html(library):
+    record, _status, _duplicate = _save("http://example.com/g", ["Text that survives."])
+    html_path, text_path = core.article_paths(record)
+    os.remove(html_path)
+    report = core.check_integrity()
+    assert report["missing"] == [core.content_id(record)] and not report["removed"]
+    assert len(core.load_index()) == 1
+    with open(html_path, encoding="utf-8") as f:
+        assert "Text that survives." in f.read()
+    os.remove(html_path)
+    os.remove(text_path)
+    report = core.check_integrity()
+    assert report["removed"] == ["Article"] and core.load_index() == []
+
+
+def test_decompressor_padding_and_corruption():
+    body = gzip.compress(b"hello " * 100) + gzip.compress(b"world") + b"\0" * 16
+    decompressor = core._StreamDecompressor("gzip")
+    out = b"".join(decompressor.decompress(body[i:i + 5]) for i in range(0, len(body), 5))
+    assert out + decompressor.flush() == b"hello " * 100 + b"world"
+    with pytest.raises(core.ContentDecodingError):
+        core._StreamDecompressor("gzip").decompress(body[:10] + b"garbage" * 20)
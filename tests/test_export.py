@@ -0,0 +1,72 @@
+import io
+import zipfile
+from xml.dom import minidom
+
+from readLater import core
+
+ARTICLE = (
+    "<html><body><h1>Title é\x0b</h1><p>Intro with <b>bold</b>, <i>italic</i> and \x01 control.</p>"
+    "<ul><li>One<ul><li>Nested</li></ul></li></ul><ol><li>First</li></ol>"
+    "<pre>code  line\n  indented</pre><blockquote>Quoted</blockquote></body></html>"
+)
+
+
+def _xml_parts(path):
+    with zipfile.ZipFile(path) as zf:
+        return {
+            name: zf.read(name) for name in zf.namelist()
+            if name.endswith((".xml", ".rels", ".xhtml", ".ncx", ".opf"))
+        }
+
+
+def test_docx_parts_parse(tmp_path):
+    dest = str(tmp_path / "a.docx")
+    core.write_docx(ARTICLE, dest, "Bad\x0btitle")
+    parts = _xml_parts(dest)
+    assert "word/document.xml" in parts and "word/numbering.xml" in parts
+    for data in parts.values():
+        minidom.parseString(data)
+    document = parts["word/document.xml"].decode("utf-8")
+    assert "Heading1" in document and "<w:b/>" in document and "<w:i/>" in document
+    assert "Nested" in document and "\x01" not in document
+
+
+def test_docx_from_file_in_chunks(tmp_path, monkeypatch):
+    whole, chunked = str(tmp_path / "a.docx"), str(tmp_path / "b.docx")
+    core.write_docx(ARTICLE, whole, "T")
+    read_chunks = core._read_chunks
+    monkeypatch.setattr(core, "_read_chunks", lambda source: read_chunks(source, 5))
+    core.write_docx(io.StringIO(ARTICLE), chunked, "T")
+    assert _xml_parts(whole)["word/document.xml"] == _xml_parts(chunked)["word/document.xml"]
+
+
+def _long_article():
+    filler = "".join("<p>Paragraph %d with enough words to fill a chapter.</p>" % i for i in range(120))
+    return (
+        "<html><body><h1>Start</h1>%s<h2>Second ü</h2>%s<h3>Inner</h3><p>x</p>"
+        "<h2>Third</h2><p>Short.</p><h2>Fourth</h2><p>End \x0b.</p></body></html>" % (filler, filler)
+    )
+
+
+def test_epub_structure(tmp_path):
+    dest = str(tmp_path / "a.epub")
+    core.write_epub(_long_article(), dest, "Book")
+    with zipfile.ZipFile(dest) as zf:
+        first = zf.infolist()[0]
+        assert first.filename == "mimetype" and first.compress_type == zipfile.ZIP_STORED
+    parts = _xml_parts(dest)
+    docs = {name: minidom.parseString(data) for name, data in parts.items()}
+    chapters = sorted(name for name in parts if name.startswith("OEBPS/chapter"))
+    # Split at each h2 that follows a long enough chapter, but not before Fourth.
+    assert len(chapters) == 3
+    ids = {}
+    for name in chapters:
+        for tag in ("h1", "h2", "h3"):
+            for element in docs[name].getElementsByTagName(tag):
+                ids[name.split("/")[-1] + "#" + element.getAttribute("id")] = tag
+    assert "chapter2.xhtml#h2" in ids and "chapter3.xhtml#h4" in ids and "chapter3.xhtml#h5" in ids
+    nav_links = [a.getAttribute("href") for a in docs["OEBPS/nav.xhtml"].getElementsByTagName("a")]
+    ncx_links = [c.getAttribute("src") for c in docs["OEBPS/toc.ncx"].getElementsByTagName("content")]
+    assert nav_links == ncx_links == list(ids)
+    spine = docs["OEBPS/content.opf"].getElementsByTagName("itemref")
+    assert len(spine) == len(chapters)
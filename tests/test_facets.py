@@ -0,0 +1,45 @@
+from readLater import facets
+
+RECORDS = [
+    {"id": "a", "title": "How to read code", "url": "", "tags": ["Python"], "read": True},
+    {"id": "b", "title": "Not a drill", "url": "", "tags": ["news"], "folder": "Work"},
+    {"id": "c", "title": "Python tips", "url": "", "tags": ["python", "tips"], "archived": True},
+]
+
+
+def _ids(query):
+    index = facets.FacetIndex.build(RECORDS)
+    return index.ids(facets.evaluate(index, query, RECORDS))
+
+
+def test_is_filter_query_needs_explicit_syntax():
+    for query in ("how to read", "not", "read", "archived", "cats and dogs", "(draft)"):
+        assert not facets.is_filter_query(query)
+    for query in ("is:unread", "tag:python", "folder:work", "code AND tips", "NOT drill"):
+        assert facets.is_filter_query(query)
+
+
+def test_terms():
+    assert _ids("is:read") == {"a"}
+    assert _ids("is:unread") == {"b", "c"}
+    assert _ids("is:archived") == {"c"}
+    assert _ids("tag:PYTHON") == {"a", "c"}
+    assert _ids("folder:work") == {"b"}
+    assert _ids("drill") == {"b"}
+
+
+def test_precedence():
+    # NOT binds tighter than AND, which binds tighter than OR.
+    assert _ids("tag:news OR tag:python AND is:read") == {"a", "b"}
+    assert _ids("(tag:news OR tag:python) AND is:unread") == {"b", "c"}
+    assert _ids("NOT tag:python OR is:archived") == {"b", "c"}
+    assert _ids("NOT (tag:python OR is:archived)") == {"b"}
+    assert _ids("tag:python NOT is:archived") == {"a"}
+
+
+def test_index_updates():
+    index = facets.FacetIndex.build(RECORDS)
+    index.update(dict(RECORDS[1], read=True))
+    assert index.ids(facets.evaluate(index, "is:read", RECORDS)) == {"a", "b"}
+    index.remove("a")
+    assert index.ids(facets.evaluate(index, "tag:python", RECORDS)) == {"c"}
@@ -0,0 +1,44 @@
+import random
+
+from readLater import htmlScan
+
+FUZZ_PIECES = (
+    "<", ">", "</", "/>", "\"", "'", "=", " ", "\n", "<!--", "-->", "<!DOCTYPE html>",
+    "<script>", "</script>", "</script foo>", "<style>", "</style>", "<svg/>", "<p>", "</p>",
+    "<a href=\"#\" onclick=\"evil()\">", "onload=", "text", "&amp;", "İ", "<SCRIPT>", "</SCRIPT >",
+)
+
+
+def _documents(count=300, seed=1):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield "".join(rng.choice(FUZZ_PIECES) for _ in range(rng.randint(0, 200)))
+
+
+def test_tokens_cover_the_input():
+    for html in _documents():
+        pos = 0
+        for token in htmlScan.iter_tokens(html):
+            assert token.start == pos and token.end > token.start, html
+            pos = token.end
+        assert pos == len(html), html
+
+
+def test_sanitize_leaves_no_scripts_or_handlers():
+    for html in _documents():
+        for token in htmlScan.iter_tokens(htmlScan.sanitize(html)):
+            assert token.kind != "start" or token.name != "script", html
+            assert not any(name.startswith("on") for name, _start, _end in token.attrs), html
+
+
+def test_sanitize_cannot_splice_a_tag():
+    # Removing the inner script must not join "<" and "script>" into a new tag.
+    cleaned = htmlScan.sanitize("<<script>x</script>script>alert(1)</script>")
+    assert all(token.name != "script" for token in htmlScan.iter_tokens(cleaned) if token.kind == "start")
+
+
+def test_strip_tags_and_find_element_content():
+    html = "<p>One <b>two</b></p><script>hidden()</script><p>three</p>"
+    assert htmlScan.strip_tags(html) == "One two three"
+    assert htmlScan.find_element_content("<div><main id=m>Body</main></div>", "main") == "Body"
+    assert htmlScan.find_element_content("<mainx>no</mainx>", "main") is None
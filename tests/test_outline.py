@@ -0,0 +1,28 @@
+from readLater import core
+
+ARTICLE = (
+    "<html><body><h1>Über café</h1><p>Intro — naïve text.</p>"
+    "<h2>Second &amp; ☃ part</h2><p>Inside ünïcode.</p><h3>Deeper 日本</h3><p>Deep.</p>"
+    "<h2>Last</h2><p>End.</p></body></html>"
+)
+
+
+def test_outline_offsets_are_byte_positions(library):
+    record, _status, _duplicate = core.store_article("T", "http://example.com/o", ARTICLE, core.html_to_text(ARTICLE))
+    outline = core.load_outline(record)
+    assert [(e["level"], e["text"]) for e in outline] == [
+        (1, "Über café"), (2, "Second & ☃ part"), (3, "Deeper 日本"), (2, "Last"),
+    ]
+    with open(core.article_paths(record)[0], "rb") as f:
+        data = f.read()
+    for entry in outline:
+        assert data[entry["offset"]:entry["offset"] + 3] == ("<h%d" % entry["level"]).encode()
+    assert core.load_outline(record, rebuild=True) == outline
+
+
+def test_read_section(library):
+    record, _status, _duplicate = core.store_article("T", "http://example.com/o", ARTICLE, core.html_to_text(ARTICLE))
+    section = core.read_section(record, 1)
+    assert "Inside ünïcode." in section and "Deeper 日本" in section and "End." not in section
+    last = core.read_section(record, 3)
+    assert "End." in last and last.count("</body>") == 1
@@ -0,0 +1,31 @@
+from readLater import revisions
+
+
+def test_delta_round_trip():
+    old = ["a", "b", "c", "d"]
+    new = ["a", "x", "c", "d", "e"]
+    assert revisions.apply_delta(old, revisions.make_delta(old, new)) == new
+    assert revisions.apply_delta(old, revisions.make_delta(old, [])) == []
+    assert revisions.apply_delta([], revisions.make_delta([], new)) == new
+
+
+def test_text_at_across_keyframes():
+    texts = ["line 0\ncommon"]
+    for number in range(1, revisions.KEYFRAME_EVERY * 2 + 3):
+        texts.append("line %d\ncommon\nextra %d" % (number, number % 3))
+    history = []
+    for text in texts:
+        revisions.append_revision(history, text, "2026-01-01")
+    assert sum("text" in revision for revision in history) == 3
+    for number, text in enumerate(texts, 1):
+        assert revisions.text_at(history, number) == text
+
+
+def test_history_file_round_trip(tmp_path):
+    path = str(tmp_path / "a.history.gz")
+    assert revisions.load_history(path) == []
+    history = []
+    revisions.append_revision(history, "one\ntwo", "2026-01-01")
+    revisions.append_revision(history, "one\nthree", "2026-01-02")
+    revisions.save_history(path, history)
+    assert revisions.text_at(revisions.load_history(path), 2) == "one\nthree"